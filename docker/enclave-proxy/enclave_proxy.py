@@ -20,6 +20,7 @@ Message types:
   parent -> enclave: http_response, kms_response, pcr_response, error
 """
 
+import base64
 import socket
 import json
 import struct
@@ -27,11 +28,19 @@ import sys
 import os
 import time
 import signal
+import shlex
 import subprocess
 import threading
 import traceback
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.parse import urlparse
+import queue
+import itertools
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 VMADDR_CID_HOST = 3
 VSOCK_PORT = 5000
@@ -42,25 +51,57 @@ HEALTH_CHECK_PORT = 8888
 # Global vsock connection shared by all proxy threads
 _vsock_lock = threading.Lock()
 _vsock_conn = None
-_request_id_counter = 0
-_pending_responses = {}
+_pending_futures = {}
+_pending_streams = {}
 _pending_lock = threading.Lock()
 _shutdown_event = threading.Event()
 
+# itertools.count relies on the GIL for atomicity, so minting takes no lock
+# and no longer contends on _vsock_lock, which the old counter shared with
+# the send path. A single process-wide counter is deliberate: thread-derived
+# prefixes get recycled with the thread ident, and a reused id lets a late
+# reply resolve the wrong request's future.
+_request_ids = itertools.count(1)
+
 
 def next_request_id():
-    global _request_id_counter
-    with _vsock_lock:
-        _request_id_counter += 1
-        return f"req-{_request_id_counter}"
+    """Mint a process-unique request id without taking any lock."""
+    return f"r{next(_request_ids)}"
+
+
+# Frame codec state. orjson serializes straight to bytes via a C fast path;
+# stdlib json is the fallback when it is not installed in the image. The
+# 4-byte header buffer is reused across frames (writes are serialized by
+# _vsock_lock) so the framing layer allocates nothing but the payload.
+_HEADER_STRUCT = struct.Struct("!I")
+_header_buf = bytearray(_HEADER_STRUCT.size)
+
+if orjson is not None:
+    def _encode_frame(message):
+        return orjson.dumps(message)
+
+    def _decode_frame(payload):
+        return orjson.loads(payload)
+else:
+    def _encode_frame(message):
+        return json.dumps(message).encode("utf-8")
+
+    def _decode_frame(payload):
+        return json.loads(payload)
 
 
 def send_message(sock, message):
     """Send a length-prefixed JSON message over the socket."""
-    payload = json.dumps(message).encode("utf-8")
-    header = struct.pack("!I", len(payload))
+    payload = _encode_frame(message)
     with _vsock_lock:
-        sock.sendall(header + payload)
+        _HEADER_STRUCT.pack_into(_header_buf, 0, len(payload))
+        # Vectored send avoids concatenating header + payload; fall back to
+        # sendall for whatever a short sendmsg leaves behind.
+        sent = sock.sendmsg([_header_buf, payload])
+        total = len(_header_buf) + len(payload)
+        if sent < total:
+            remainder = bytes(_header_buf) + payload
+            sock.sendall(remainder[sent:])
 
 
 def recv_message(sock):
@@ -68,52 +109,113 @@ def recv_message(sock):
     header = _recv_exact(sock, 4)
     if not header:
         return None
-    length = struct.unpack("!I", header)[0]
+    length = _HEADER_STRUCT.unpack(header)[0]
     if length > 10 * 1024 * 1024:  # 10 MB safety limit
         raise ValueError(f"Message too large: {length} bytes")
     payload = _recv_exact(sock, length)
     if not payload:
         return None
-    return json.loads(payload.decode("utf-8"))
+    return _decode_frame(payload)
 
 
 def _recv_exact(sock, n):
-    """Read exactly n bytes from socket."""
-    data = b""
-    while len(data) < n:
-        chunk = sock.recv(n - len(data))
-        if not chunk:
+    """Read exactly n bytes from socket into a preallocated buffer.
+
+    recv_into writes straight into the buffer, avoiding the quadratic
+    bytes-concatenation cost the old ``data += chunk`` loop paid on large
+    frames. The codec accepts the returned bytearray as-is.
+    """
+    buf = bytearray(n)
+    view = memoryview(buf)
+    offset = 0
+    while offset < n:
+        received = sock.recv_into(view[offset:], n - offset)
+        if not received:
             return None
-        data += chunk
-    return data
+        offset += received
+    return buf
+
+
+# Log frames are coalesced by a background writer so a chatty user app does
+# not pay one vsock syscall per line. The queue is bounded: when the parent
+# cannot keep up we drop frames rather than stall the application.
+_LOG_BATCH_MAX_FRAMES = 64
+_LOG_BATCH_MAX_BYTES = 64 * 1024
+_log_queue = queue.Queue(maxsize=8192)
+
+# Pre-encoded envelope pieces for log frames: the envelope is spliced from
+# constant byte fragments so the hot path only serializes the payload dict
+# instead of building and encoding the three-key envelope per line.
+_LOG_FRAME_PREFIX = b'{"type":"log","id":"'
+_LOG_FRAME_INFIX = b'","payload":'
 
 
 def send_log(level, message):
-    """Send a log message to the parent for CloudWatch."""
-    global _vsock_conn
+    """Queue a log message for batched delivery to the parent."""
     if _vsock_conn:
+        payload = _encode_frame({
+            "level": level,
+            "message": message,
+            "timestamp": time.time(),
+        })
+        frame = b"".join((
+            _LOG_FRAME_PREFIX,
+            next_request_id().encode("ascii"),
+            _LOG_FRAME_INFIX,
+            payload,
+            b"}",
+        ))
         try:
-            send_message(_vsock_conn, {
-                "type": "log",
-                "id": next_request_id(),
-                "payload": {
-                    "level": level,
-                    "message": message,
-                    "timestamp": time.time(),
-                }
-            })
-        except Exception:
-            pass
+            _log_queue.put_nowait(frame)
+        except queue.Full:
+            pass  # Drop rather than block the caller
     print(f"[ENCLAVE-PROXY] [{level.upper()}] {message}", flush=True)
 
 
+def log_writer():
+    """Background thread that drains the log queue in coalesced batches.
+
+    Each batch is sent as a single vectored write of up to 64 already-framed
+    messages (or 64 KiB), so the wire format is unchanged — the parent still
+    sees individual length-prefixed frames.
+    """
+    while not (_shutdown_event.is_set() and _log_queue.empty()):
+        try:
+            frame = _log_queue.get(timeout=1)
+        except queue.Empty:
+            continue
+
+        iov = [_HEADER_STRUCT.pack(len(frame)), frame]
+        total = 4 + len(frame)
+        while (len(iov) // 2 < _LOG_BATCH_MAX_FRAMES
+               and total < _LOG_BATCH_MAX_BYTES):
+            try:
+                frame = _log_queue.get_nowait()
+            except queue.Empty:
+                break
+            iov.append(_HEADER_STRUCT.pack(len(frame)))
+            iov.append(frame)
+            total += 4 + len(frame)
+
+        conn = _vsock_conn
+        if conn is None:
+            continue
+        try:
+            with _vsock_lock:
+                sent = conn.sendmsg(iov)
+                if sent < total:
+                    conn.sendall(b"".join(iov)[sent:])
+        except Exception:
+            pass  # Connection problems are surfaced by the dispatcher
+
+
 def send_request_and_wait(msg_type, payload, timeout=30):
     """Send a request to the parent and wait for the response."""
     global _vsock_conn
     req_id = next_request_id()
-    event = threading.Event()
+    future = Future()
     with _pending_lock:
-        _pending_responses[req_id] = {"event": event, "response": None}
+        _pending_futures[req_id] = future
 
     send_message(_vsock_conn, {
         "type": msg_type,
@@ -121,14 +223,46 @@ def send_request_and_wait(msg_type, payload, timeout=30):
         "payload": payload,
     })
 
-    if not event.wait(timeout=timeout):
-        with _pending_lock:
-            _pending_responses.pop(req_id, None)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
         raise TimeoutError(f"Request {req_id} timed out after {timeout}s")
+    finally:
+        with _pending_lock:
+            _pending_futures.pop(req_id, None)
+
 
+def send_http_request(payload, timeout=60):
+    """Send an http_request and return (first_response, chunk_queue, req_id).
+
+    The first response is either a complete http_response or an
+    http_response_start whose body follows as http_response_chunk frames on
+    the returned queue. The caller owns removing req_id from
+    _pending_streams once the body is consumed.
+    """
+    req_id = next_request_id()
+    future = Future()
+    chunk_queue = queue.Queue()
     with _pending_lock:
-        result = _pending_responses.pop(req_id)
-    return result["response"]
+        _pending_futures[req_id] = future
+        _pending_streams[req_id] = chunk_queue
+
+    send_message(_vsock_conn, {
+        "type": "http_request",
+        "id": req_id,
+        "payload": payload,
+    })
+
+    try:
+        first = future.result(timeout=timeout)
+    except FutureTimeoutError:
+        with _pending_lock:
+            _pending_streams.pop(req_id, None)
+        raise TimeoutError(f"Request {req_id} timed out after {timeout}s")
+    finally:
+        with _pending_lock:
+            _pending_futures.pop(req_id, None)
+    return first, chunk_queue, req_id
 
 
 def response_dispatcher():
@@ -143,18 +277,35 @@ def response_dispatcher():
                 break
             req_id = msg.get("id")
             if req_id:
-                with _pending_lock:
-                    if req_id in _pending_responses:
-                        _pending_responses[req_id]["response"] = msg
-                        _pending_responses[req_id]["event"].set()
+                # Plain dict .get is atomic under the GIL; the lock is only
+                # needed for insert/pop in send_request_and_wait.
+                if msg.get("type") == "http_response_chunk":
+                    chunk_queue = _pending_streams.get(req_id)
+                    if chunk_queue is not None:
+                        chunk_queue.put(msg)
                     else:
-                        send_log("warn", f"Unexpected response for {req_id}")
+                        send_log("warn", f"Unexpected chunk for {req_id}")
+                    continue
+                future = _pending_futures.get(req_id)
+                if future is not None:
+                    future.set_result(msg)
+                else:
+                    send_log("warn", f"Unexpected response for {req_id}")
         except Exception as e:
             if not _shutdown_event.is_set():
                 send_log("error", f"Dispatcher error: {e}")
                 time.sleep(1)
 
 
+# Headers stripped when tunneling, precomputed so each request pays one
+# frozenset membership test per header instead of a tuple scan.
+_REQUEST_SKIP_HEADERS = frozenset({
+    "host", "proxy-connection", "proxy-authorization",
+    "connection", "keep-alive", "upgrade",
+})
+_RESPONSE_SKIP_HEADERS = frozenset({"transfer-encoding", "content-length"})
+
+
 class HTTPProxyHandler(BaseHTTPRequestHandler):
     """HTTP forward proxy that tunnels requests through vsock to the parent."""
 
@@ -184,52 +335,122 @@ class HTTPProxyHandler(BaseHTTPRequestHandler):
             content_length = int(self.headers.get("Content-Length", 0))
             body = self.rfile.read(content_length) if content_length > 0 else b""
 
-            headers = {}
-            for key, value in self.headers.items():
-                if key.lower() not in ("host", "proxy-connection", "proxy-authorization"):
-                    headers[key] = value
-
-            response = send_request_and_wait("http_request", {
+            headers = {
+                key: value
+                for key, value in self.headers.items()
+                if key.lower() not in _REQUEST_SKIP_HEADERS
+            }
+
+            # Bodies travel base64-encoded so binary payloads (gzip, images,
+            # protobuf) survive the JSON protocol instead of being mangled by
+            # a lossy utf-8 round-trip. "body" remains as the legacy text
+            # field for older peers.
+            request_payload = {
                 "method": method,
                 "url": self.path,
                 "headers": headers,
-                "body": body.decode("utf-8", errors="replace") if body else "",
-            }, timeout=60)
-
-            resp_payload = response.get("payload", {})
-            status = resp_payload.get("status", 502)
-            resp_headers = resp_payload.get("headers", {})
-            resp_body = resp_payload.get("body", "").encode("utf-8")
-
-            self.send_response(status)
-            for k, v in resp_headers.items():
-                if k.lower() not in ("transfer-encoding", "content-length"):
-                    self.send_header(k, v)
-            self.send_header("Content-Length", str(len(resp_body)))
-            self.end_headers()
-            self.wfile.write(resp_body)
+            }
+            if body:
+                request_payload["body_b64"] = base64.b64encode(body).decode("ascii")
+
+            response, chunk_queue, req_id = send_http_request(request_payload,
+                                                              timeout=60)
+            try:
+                if response.get("type") == "http_response_start":
+                    try:
+                        self._relay_streamed_response(response, chunk_queue)
+                    except Exception as e:
+                        # The status line and headers are already on the wire,
+                        # so a second send_error would corrupt the body; the
+                        # only valid failure signal now is dropping the
+                        # connection.
+                        send_log("warning", f"HTTP Proxy: stream aborted: {e}")
+                        self.close_connection = True
+                    return
+                self._relay_buffered_response(response)
+            finally:
+                with _pending_lock:
+                    _pending_streams.pop(req_id, None)
 
         except TimeoutError:
             self.send_error(504, "Gateway Timeout: parent proxy did not respond")
         except Exception as e:
             self.send_error(502, f"Bad Gateway: {e}")
 
+    def _relay_buffered_response(self, response):
+        """Write a complete http_response back to the client."""
+        resp_payload = response.get("payload", {})
+        status = resp_payload.get("status", 502)
+        resp_headers = resp_payload.get("headers", {})
+        if "body_b64" in resp_payload:
+            resp_body = base64.b64decode(resp_payload["body_b64"])
+        else:
+            resp_body = resp_payload.get("body", "").encode("utf-8")
+
+        self.send_response(status)
+        for k, v in resp_headers.items():
+            if k.lower() not in _RESPONSE_SKIP_HEADERS:
+                self.send_header(k, v)
+        self.send_header("Content-Length", str(len(resp_body)))
+        self.end_headers()
+        self.wfile.write(resp_body)
+
+    def _relay_streamed_response(self, response, chunk_queue):
+        """Write a chunked http_response_start + http_response_chunk stream.
+
+        Chunks are written to the client as they arrive, so time-to-first-
+        byte no longer waits on the full upstream body and large downloads
+        are never fully buffered in this process. The body length is unknown
+        up front, so the connection is closed to mark the end of the body.
+        """
+        resp_payload = response.get("payload", {})
+        self.send_response(resp_payload.get("status", 502))
+        for k, v in resp_payload.get("headers", {}).items():
+            if k.lower() not in _RESPONSE_SKIP_HEADERS:
+                self.send_header(k, v)
+        self.send_header("Connection", "close")
+        self.close_connection = True
+        self.end_headers()
+
+        while True:
+            try:
+                chunk_msg = chunk_queue.get(timeout=60)
+            except queue.Empty:
+                raise TimeoutError("Timed out waiting for response chunk")
+            chunk_payload = chunk_msg.get("payload", {})
+            body_b64 = chunk_payload.get("body_b64")
+            if body_b64:
+                self.wfile.write(base64.b64decode(body_b64))
+            if chunk_payload.get("last"):
+                break
+
     def log_message(self, format, *args):
         send_log("debug", f"HTTP Proxy: {format % args}")
 
 
+# Known KMS proxy endpoints, resolved with one dict lookup per request
+# instead of a urlparse + strip round.
+_KMS_OPS = {
+    "/decrypt": "decrypt",
+    "/encrypt": "encrypt",
+    "/generate-data-key": "generate-data-key",
+}
+
+
 class KMSProxyHandler(BaseHTTPRequestHandler):
     """Local KMS proxy that forwards decrypt/encrypt requests through vsock with attestation."""
 
     def do_POST(self):
         try:
+            operation = _KMS_OPS.get(self.path.partition("?")[0])
+            if operation is None:
+                self.send_error(404, f"Unknown KMS operation: {self.path}")
+                return
+
             content_length = int(self.headers.get("Content-Length", 0))
             body = self.rfile.read(content_length) if content_length > 0 else b""
             request_data = json.loads(body.decode("utf-8")) if body else {}
 
-            path = urlparse(self.path).path
-            operation = path.strip("/")
-
             response = send_request_and_wait("kms_request", {
                 "operation": operation,
                 "data": request_data,
@@ -276,46 +497,86 @@ class HealthCheckHandler(BaseHTTPRequestHandler):
         pass  # Suppress health check logging
 
 
+# Live server instances, so shutdown can unblock their serve_forever loops.
+_servers = []
+
+
+def _serve(server):
+    """Serve until shutdown_servers() is called, then close the socket."""
+    _servers.append(server)
+    server.serve_forever()
+    server.server_close()
+
+
+def shutdown_servers():
+    """Unblock every serve_forever loop. Safe to call more than once."""
+    for server in _servers:
+        # shutdown() blocks until the serve loop exits, so detach it from
+        # the caller (which may be a signal handler).
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+
 def run_http_proxy():
     """Start the HTTP forward proxy server."""
-    server = HTTPServer(("127.0.0.1", HTTP_PROXY_PORT), HTTPProxyHandler)
-    server.timeout = 1
+    # ThreadingHTTPServer lets concurrent user-app requests be in flight over
+    # the multiplexed vsock instead of serializing behind a single handler.
+    server = ThreadingHTTPServer(("127.0.0.1", HTTP_PROXY_PORT), HTTPProxyHandler)
+    server.daemon_threads = True
     send_log("info", f"HTTP proxy listening on 127.0.0.1:{HTTP_PROXY_PORT}")
-    while not _shutdown_event.is_set():
-        server.handle_request()
-    server.server_close()
+    _serve(server)
 
 
 def run_kms_proxy():
     """Start the KMS proxy server."""
-    server = HTTPServer(("127.0.0.1", KMS_PROXY_PORT), KMSProxyHandler)
-    server.timeout = 1
+    server = ThreadingHTTPServer(("127.0.0.1", KMS_PROXY_PORT), KMSProxyHandler)
+    server.daemon_threads = True
     send_log("info", f"KMS proxy listening on 127.0.0.1:{KMS_PROXY_PORT}")
-    while not _shutdown_event.is_set():
-        server.handle_request()
-    server.server_close()
+    _serve(server)
 
 
 def run_health_check():
     """Start the health check server."""
-    server = HTTPServer(("127.0.0.1", HEALTH_CHECK_PORT), HealthCheckHandler)
-    server.timeout = 1
-    while not _shutdown_event.is_set():
-        server.handle_request()
-    server.server_close()
+    server = ThreadingHTTPServer(("127.0.0.1", HEALTH_CHECK_PORT), HealthCheckHandler)
+    server.daemon_threads = True
+    _serve(server)
 
 
 def stream_process_output(proc, stream_name):
-    """Read lines from a subprocess stream and send them as log messages."""
+    """Read a subprocess stream in large chunks and forward lines as logs.
+
+    os.read on the raw pipe fd pulls up to 64 KiB per syscall into a
+    persistent accumulator, instead of one buffered readline (and one bytes
+    allocation) per line. Only complete lines are forwarded; a trailing
+    partial line waits for its newline or for process exit.
+    """
     stream = proc.stdout if stream_name == "stdout" else proc.stderr
     if stream is None:
         return
-    for line in iter(stream.readline, b""):
-        if _shutdown_event.is_set():
+    level = "app" if stream_name == "stdout" else "app_err"
+    fd = stream.fileno()
+    buf = bytearray()
+
+    while not _shutdown_event.is_set():
+        try:
+            chunk = os.read(fd, 65536)
+        except OSError:
+            break
+        if not chunk:
             break
-        decoded = line.decode("utf-8", errors="replace").rstrip("\n")
+        buf.extend(chunk)
+        last_newline = buf.rfind(b"\n")
+        if last_newline < 0:
+            continue
+        for line in bytes(buf[:last_newline]).split(b"\n"):
+            decoded = line.decode("utf-8", errors="replace").rstrip("\r")
+            if decoded:
+                send_log(level, decoded)
+        del buf[:last_newline + 1]
+
+    if buf:
+        decoded = buf.decode("utf-8", errors="replace").rstrip("\n")
         if decoded:
-            send_log("app" if stream_name == "stdout" else "app_err", decoded)
+            send_log(level, decoded)
 
 
 def connect_to_parent(max_retries=30, retry_delay=10):
@@ -328,6 +589,10 @@ def connect_to_parent(max_retries=30, retry_delay=10):
         try:
             sock = socket.socket(socket.AF_VSOCK, socket.SOCK_STREAM)
             sock.settimeout(120)
+            # 1 MiB socket buffers: large HTTP bodies stream through the
+            # tunnel without the sender blocking on the default vsock buffer.
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
             sock.connect((VMADDR_CID_HOST, VSOCK_PORT))
             _vsock_conn = sock
 
@@ -365,6 +630,18 @@ def request_pcr_values():
         return {}
 
 
+# Environment overrides for the user application, computed once at import.
+_PROXY_ENV_DELTA = {
+    "HTTP_PROXY": f"http://127.0.0.1:{HTTP_PROXY_PORT}",
+    "HTTPS_PROXY": f"http://127.0.0.1:{HTTP_PROXY_PORT}",
+    "http_proxy": f"http://127.0.0.1:{HTTP_PROXY_PORT}",
+    "https_proxy": f"http://127.0.0.1:{HTTP_PROXY_PORT}",
+    "TREZA_KMS_ENDPOINT": f"http://127.0.0.1:{KMS_PROXY_PORT}",
+    "NO_PROXY": "127.0.0.1,localhost",
+    "no_proxy": "127.0.0.1,localhost",
+}
+
+
 def run_user_application():
     """Launch the user's application with proxy environment variables set."""
     user_cmd = os.environ.get("TREZA_USER_CMD", "")
@@ -380,22 +657,26 @@ def run_user_application():
         send_log("warn", "No user command configured. Enclave proxy running in standalone mode.")
         return None
 
-    env = os.environ.copy()
-    env["HTTP_PROXY"] = f"http://127.0.0.1:{HTTP_PROXY_PORT}"
-    env["HTTPS_PROXY"] = f"http://127.0.0.1:{HTTP_PROXY_PORT}"
-    env["http_proxy"] = f"http://127.0.0.1:{HTTP_PROXY_PORT}"
-    env["https_proxy"] = f"http://127.0.0.1:{HTTP_PROXY_PORT}"
-    env["TREZA_KMS_ENDPOINT"] = f"http://127.0.0.1:{KMS_PROXY_PORT}"
-    env["NO_PROXY"] = "127.0.0.1,localhost"
-    env["no_proxy"] = "127.0.0.1,localhost"
+    env = {**os.environ, **_PROXY_ENV_DELTA}
 
     send_log("info", f"Starting user application: {user_cmd}")
 
+    # shell=False lets Popen use the posix_spawn fast path and avoids leaving
+    # a /bin/sh parent in front of the user application. Commands that need
+    # shell features keep the old behavior.
+    use_shell = any(ch in user_cmd for ch in "|&;<>$`\\\n\"'*?~#()")
+    if not use_shell:
+        try:
+            user_cmd = shlex.split(user_cmd)
+        except ValueError:
+            use_shell = True
+
     proc = subprocess.Popen(
         user_cmd,
-        shell=True,
+        shell=use_shell,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
+        bufsize=0,  # the streamers read the raw pipe fds directly
         env=env,
     )
 
@@ -424,6 +705,9 @@ def main():
     dispatcher_thread = threading.Thread(target=response_dispatcher, daemon=True)
     dispatcher_thread.start()
 
+    log_writer_thread = threading.Thread(target=log_writer, daemon=True)
+    log_writer_thread.start()
+
     send_log("info", f"Enclave proxy started for {enclave_id}")
 
     pcr_values = request_pcr_values()
@@ -442,6 +726,7 @@ def main():
     def handle_signal(signum, frame):
         send_log("info", f"Received signal {signum}, shutting down...")
         _shutdown_event.set()
+        shutdown_servers()
         if user_proc and user_proc.poll() is None:
             user_proc.terminate()
 
@@ -503,6 +788,7 @@ def main():
         while not _shutdown_event.is_set():
             _shutdown_event.wait(timeout=30)
 
+    shutdown_servers()
     send_log("info", "Enclave proxy shutting down")
 
 
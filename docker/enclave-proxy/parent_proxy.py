@@ -13,6 +13,7 @@ Provides the vsock-to-network bridge for enclaves:
 Uses the same length-prefixed JSON protocol as enclave_proxy.py.
 """
 
+import base64
 import socket
 import json
 import struct
@@ -22,6 +23,8 @@ import time
 import threading
 import subprocess
 import logging
+import queue
+import selectors
 import urllib.request
 import urllib.error
 
@@ -30,6 +33,16 @@ try:
 except ImportError:
     boto3 = None
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import urllib3
+except ImportError:
+    urllib3 = None
+
 VMADDR_CID_ANY = 0xFFFFFFFF  # -1 as unsigned
 VSOCK_PORT = 5000
 
@@ -42,7 +55,16 @@ log = logging.getLogger("parent-proxy")
 
 
 class CloudWatchLogger:
-    """Buffered CloudWatch Logs writer."""
+    """Buffered CloudWatch Logs writer.
+
+    Messages are appended to per-stream buffers and flushed by a background
+    thread every 200 ms (or in chunks within the put_log_events limits), so a
+    chatty enclave batches hundreds of lines into one API call instead of
+    paying a full CloudWatch round-trip per line.
+    """
+
+    FLUSH_INTERVAL = 0.2
+    MAX_BATCH_EVENTS = 10000
 
     def __init__(self, enclave_id, region=None):
         self.enclave_id = enclave_id
@@ -50,6 +72,8 @@ class CloudWatchLogger:
         self.client = None
         self.log_group = f"/aws/ec2/enclave/{enclave_id}"
         self.log_streams = {}
+        self._buffers = {}
+        self._tokens = {}
         self._lock = threading.Lock()
 
         if boto3:
@@ -59,6 +83,10 @@ class CloudWatchLogger:
             except Exception as e:
                 log.warning(f"CloudWatch init failed: {e}")
 
+        if self.client:
+            flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            flusher.start()
+
     def _ensure_log_group(self):
         try:
             self.client.create_log_group(logGroupName=self.log_group)
@@ -76,66 +104,131 @@ class CloudWatchLogger:
             self.log_streams[stream_name] = True
 
     def write(self, stream_name, message):
-        """Write a log message to CloudWatch."""
+        """Buffer a log message for batched delivery to CloudWatch."""
         log.info(f"[{stream_name}] {message}")
         if not self.client:
             return
+        event = {"timestamp": int(time.time() * 1000), "message": message}
         with self._lock:
+            self._buffers.setdefault(stream_name, []).append(event)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        """Flush all non-empty stream buffers to CloudWatch."""
+        with self._lock:
+            pending = {
+                stream: events
+                for stream, events in self._buffers.items() if events
+            }
+            for stream in pending:
+                self._buffers[stream] = []
+
+        for stream_name, events in pending.items():
+            for start in range(0, len(events), self.MAX_BATCH_EVENTS):
+                self._put_events(stream_name,
+                                 events[start:start + self.MAX_BATCH_EVENTS])
+
+    def _fetch_token(self, stream_name):
+        """Look up the stream's current uploadSequenceToken."""
+        response = self.client.describe_log_streams(
+            logGroupName=self.log_group, logStreamNamePrefix=stream_name
+        )
+        if response["logStreams"]:
+            return response["logStreams"][0].get("uploadSequenceToken")
+        return None
+
+    def _put_events(self, stream_name, events):
+        # The sequence token returned by each put_log_events is cached, so
+        # the steady state is one API call per flush. describe_log_streams
+        # only runs again if the cached token is rejected (e.g. another
+        # writer touched the stream).
+        try:
+            self._ensure_log_stream(stream_name)
+            kwargs = {
+                "logGroupName": self.log_group,
+                "logStreamName": stream_name,
+                "logEvents": events,
+            }
+            token = self._tokens.get(stream_name)
+            if token:
+                kwargs["sequenceToken"] = token
             try:
-                self._ensure_log_stream(stream_name)
-                response = self.client.describe_log_streams(
-                    logGroupName=self.log_group, logStreamNamePrefix=stream_name
-                )
-                kwargs = {
-                    "logGroupName": self.log_group,
-                    "logStreamName": stream_name,
-                    "logEvents": [
-                        {"timestamp": int(time.time() * 1000), "message": message}
-                    ],
-                }
-                if response["logStreams"]:
-                    token = response["logStreams"][0].get("uploadSequenceToken")
-                    if token:
-                        kwargs["sequenceToken"] = token
-                self.client.put_log_events(**kwargs)
-            except Exception as e:
-                log.warning(f"CloudWatch write error: {e}")
+                response = self.client.put_log_events(**kwargs)
+            except self.client.exceptions.InvalidSequenceTokenException:
+                token = self._fetch_token(stream_name)
+                if token:
+                    kwargs["sequenceToken"] = token
+                else:
+                    kwargs.pop("sequenceToken", None)
+                response = self.client.put_log_events(**kwargs)
+            self._tokens[stream_name] = response.get("nextSequenceToken")
+        except Exception as e:
+            log.warning(f"CloudWatch write error: {e}")
 
 
-def send_message(conn, message):
-    """Send a length-prefixed JSON message over the socket."""
-    payload = json.dumps(message).encode("utf-8")
-    header = struct.pack("!I", len(payload))
-    conn.sendall(header + payload)
+# Frame codec: orjson when available (C fast path, bytes in/out), stdlib
+# json otherwise — same convention as the boto3 guard above.
+_HEADER_STRUCT = struct.Struct("!I")
 
+if orjson is not None:
+    def _encode_frame(message):
+        return orjson.dumps(message)
 
-def recv_message(conn):
-    """Receive a length-prefixed JSON message from the socket."""
-    header = _recv_exact(conn, 4)
-    if not header:
-        return None
-    length = struct.unpack("!I", header)[0]
-    if length > 10 * 1024 * 1024:
-        raise ValueError(f"Message too large: {length} bytes")
-    payload = _recv_exact(conn, length)
-    if not payload:
-        return None
-    return json.loads(payload.decode("utf-8"))
+    def _decode_frame(payload):
+        return orjson.loads(payload)
+else:
+    def _encode_frame(message):
+        return json.dumps(message).encode("utf-8")
+
+    def _decode_frame(payload):
+        return json.loads(payload)
 
 
-def _recv_exact(conn, n):
-    """Read exactly n bytes from socket."""
-    data = b""
-    while len(data) < n:
-        chunk = conn.recv(n - len(data))
-        if not chunk:
-            return None
-        data += chunk
-    return data
+# Per-thread reusable header buffer: multiple worker threads send frames
+# concurrently, and reusing the 4-byte buffer per thread keeps the hot send
+# path down to a single payload allocation.
+_tls = threading.local()
+
+
+def send_message(conn, message):
+    """Send a length-prefixed JSON message over the socket."""
+    payload = _encode_frame(message)
+    header = getattr(_tls, "header_buf", None)
+    if header is None:
+        header = _tls.header_buf = bytearray(_HEADER_STRUCT.size)
+    _HEADER_STRUCT.pack_into(header, 0, len(payload))
+    # Vectored send avoids concatenating header + payload.
+    sent = conn.sendmsg([header, payload])
+    total = len(header) + len(payload)
+    if sent < total:
+        conn.sendall((bytes(header) + payload)[sent:])
+
+
+# PCR measurements are immutable for the lifetime of the enclave this parent
+# serves, so the nitro-cli fork/exec only has to succeed once. Errors are not
+# cached so a late-starting enclave is retried on the next pcr_request.
+_pcr_cache = None
+_pcr_cache_lock = threading.Lock()
 
 
 def get_pcr_values():
-    """Retrieve real PCR values from nitro-cli on the parent instance."""
+    """Retrieve PCR values from nitro-cli, caching the first good answer."""
+    global _pcr_cache
+    with _pcr_cache_lock:
+        if _pcr_cache is not None:
+            return _pcr_cache
+        values = _query_pcr_values()
+        if not any(v.startswith("ERROR_") for v in values.values()):
+            _pcr_cache = values
+        return values
+
+
+def _query_pcr_values():
+    """Run nitro-cli describe-enclaves and extract the PCR measurements."""
     try:
         result = subprocess.run(
             ["/usr/bin/nitro-cli", "describe-enclaves"],
@@ -162,36 +255,88 @@ def get_pcr_values():
     }
 
 
+def _request_body_bytes(payload):
+    """Extract the raw request body from an http_request payload.
+
+    Bodies are carried base64-encoded ("body_b64") so binary content survives
+    the JSON protocol; the plain "body" string is kept for older enclaves.
+    """
+    body_b64 = payload.get("body_b64")
+    if body_b64:
+        return base64.b64decode(body_b64)
+    body = payload.get("body", "")
+    return body.encode("utf-8") if body else None
+
+
+# Pooled upstream HTTP client. Reusing connections amortizes the TCP + TLS
+# handshake across proxied requests; urllib3 ships with botocore so it is
+# present wherever boto3 is, but we keep the urllib fallback for bare hosts.
+if urllib3 is not None:
+    _http_pool = urllib3.PoolManager(
+        num_pools=64,
+        maxsize=32,
+        retries=False,
+        timeout=urllib3.Timeout(connect=5.0, read=55.0),
+    )
+else:
+    _http_pool = None
+
+
 def handle_http_request(payload):
     """Forward an HTTP request from the enclave to the real network."""
     method = payload.get("method", "GET")
     url = payload.get("url", "")
     headers = payload.get("headers", {})
-    body = payload.get("body", "")
+
+    if _http_pool is not None:
+        try:
+            response = _http_pool.request(
+                method,
+                url,
+                body=_request_body_bytes(payload),
+                headers=headers,
+            )
+            return {
+                "status": response.status,
+                "headers": dict(response.headers),
+                "body_b64": base64.b64encode(response.data).decode("ascii"),
+            }
+        except urllib3.exceptions.HTTPError as e:
+            return {
+                "status": 502,
+                "headers": {},
+                "body": f"Network error: {e}",
+            }
+        except Exception as e:
+            return {
+                "status": 502,
+                "headers": {},
+                "body": f"Proxy error: {e}",
+            }
 
     try:
         req = urllib.request.Request(
             url,
-            data=body.encode("utf-8") if body else None,
+            data=_request_body_bytes(payload),
             headers=headers,
             method=method,
         )
 
         with urllib.request.urlopen(req, timeout=55) as response:
-            resp_body = response.read().decode("utf-8", errors="replace")
+            resp_body = response.read()
             resp_headers = dict(response.getheaders())
             return {
                 "status": response.status,
                 "headers": resp_headers,
-                "body": resp_body,
+                "body_b64": base64.b64encode(resp_body).decode("ascii"),
             }
 
     except urllib.error.HTTPError as e:
-        resp_body = e.read().decode("utf-8", errors="replace") if e.fp else ""
+        resp_body = e.read() if e.fp else b""
         return {
             "status": e.code,
             "headers": dict(e.headers) if e.headers else {},
-            "body": resp_body,
+            "body_b64": base64.b64encode(resp_body).decode("ascii"),
         }
     except urllib.error.URLError as e:
         return {
@@ -207,146 +352,363 @@ def handle_http_request(payload):
         }
 
 
+def _kms_decrypt(kms_client, data):
+    response = kms_client.decrypt(
+        CiphertextBlob=bytes.fromhex(data.get("ciphertext", "")),
+        KeyId=data.get("key_id", ""),
+    )
+    return {
+        "result": {
+            "plaintext": response["Plaintext"].hex(),
+            "key_id": response["KeyId"],
+        }
+    }
+
+
+def _kms_generate_data_key(kms_client, data):
+    response = kms_client.generate_data_key(
+        KeyId=data.get("key_id", ""),
+        KeySpec=data.get("key_spec", "AES_256"),
+    )
+    return {
+        "result": {
+            "plaintext": response["Plaintext"].hex(),
+            "ciphertext_blob": response["CiphertextBlob"].hex(),
+            "key_id": response["KeyId"],
+        }
+    }
+
+
+def _kms_encrypt(kms_client, data):
+    response = kms_client.encrypt(
+        KeyId=data.get("key_id", ""),
+        Plaintext=bytes.fromhex(data.get("plaintext", "")),
+    )
+    return {
+        "result": {
+            "ciphertext_blob": response["CiphertextBlob"].hex(),
+            "key_id": response["KeyId"],
+        }
+    }
+
+
+_KMS_HANDLERS = {
+    "decrypt": _kms_decrypt,
+    "generate-data-key": _kms_generate_data_key,
+    "encrypt": _kms_encrypt,
+}
+
+
+# Bodies above the threshold are streamed to the enclave in chunk frames so
+# neither process buffers the whole download and time-to-first-byte does not
+# wait on the final upstream byte.
+_STREAM_THRESHOLD = 256 * 1024
+_STREAM_CHUNK = 64 * 1024
+
+
+def handle_http_request_streaming(reply, msg_id, payload):
+    """Forward an HTTP request, streaming large response bodies.
+
+    Small responses are answered with a single http_response frame exactly
+    as before. Larger ones get an http_response_start frame (status +
+    headers) followed by http_response_chunk frames until last=True.
+    Requires the pooled client; the urllib fallback stays fully buffered.
+    """
+    if _http_pool is None:
+        reply({
+            "type": "http_response",
+            "id": msg_id,
+            "payload": handle_http_request(payload),
+        })
+        return
+
+    method = payload.get("method", "GET")
+    url = payload.get("url", "")
+    headers = payload.get("headers", {})
+
+    try:
+        response = _http_pool.request(
+            method,
+            url,
+            body=_request_body_bytes(payload),
+            headers=headers,
+            preload_content=False,
+        )
+    except Exception as e:
+        reply({
+            "type": "http_response",
+            "id": msg_id,
+            "payload": {"status": 502, "headers": {}, "body": f"Proxy error: {e}"},
+        })
+        return
+
+    try:
+        first = response.read(_STREAM_THRESHOLD + 1)
+        if len(first) <= _STREAM_THRESHOLD:
+            reply({
+                "type": "http_response",
+                "id": msg_id,
+                "payload": {
+                    "status": response.status,
+                    "headers": dict(response.headers),
+                    "body_b64": base64.b64encode(first).decode("ascii"),
+                },
+            })
+            return
+
+        reply({
+            "type": "http_response_start",
+            "id": msg_id,
+            "payload": {
+                "status": response.status,
+                "headers": dict(response.headers),
+            },
+        })
+        chunk = first
+        while chunk:
+            next_chunk = response.read(_STREAM_CHUNK)
+            reply({
+                "type": "http_response_chunk",
+                "id": msg_id,
+                "payload": {
+                    "last": not next_chunk,
+                    "body_b64": base64.b64encode(chunk).decode("ascii"),
+                },
+            })
+            chunk = next_chunk
+    except Exception as e:
+        # Mid-stream failures can only be signalled by ending the stream.
+        reply({
+            "type": "http_response_chunk",
+            "id": msg_id,
+            "payload": {"last": True, "body_b64": ""},
+        })
+        log.warning(f"Streaming error for {msg_id}: {e}")
+    finally:
+        response.release_conn()
+
+
+_kms_client = None
+_kms_client_lock = threading.Lock()
+
+
+def _get_kms_client():
+    """Return the shared KMS client, creating it on first use.
+
+    Building a boto3 client parses the service model JSON each time, so the
+    client is created once and reused; boto3 clients are thread-safe.
+    """
+    global _kms_client
+    if _kms_client is None:
+        with _kms_client_lock:
+            if _kms_client is None:
+                _kms_client = boto3.client(
+                    "kms", region_name=os.environ.get("AWS_DEFAULT_REGION", "us-west-2")
+                )
+    return _kms_client
+
+
 def handle_kms_request(payload):
     """Forward a KMS request from the enclave, attaching attestation if available."""
     if not boto3:
         return {"error": "boto3 not available on parent"}
 
     operation = payload.get("operation", "")
-    data = payload.get("data", {})
+    kms_handler = _KMS_HANDLERS.get(operation)
+    if kms_handler is None:
+        return {"error": f"Unsupported KMS operation: {operation}"}
 
     try:
-        kms_client = boto3.client(
-            "kms", region_name=os.environ.get("AWS_DEFAULT_REGION", "us-west-2")
-        )
-
-        if operation == "decrypt":
-            response = kms_client.decrypt(
-                CiphertextBlob=bytes.fromhex(data.get("ciphertext", "")),
-                KeyId=data.get("key_id", ""),
-            )
-            return {
-                "result": {
-                    "plaintext": response["Plaintext"].hex(),
-                    "key_id": response["KeyId"],
-                }
-            }
-        elif operation == "generate-data-key":
-            response = kms_client.generate_data_key(
-                KeyId=data.get("key_id", ""),
-                KeySpec=data.get("key_spec", "AES_256"),
-            )
-            return {
-                "result": {
-                    "plaintext": response["Plaintext"].hex(),
-                    "ciphertext_blob": response["CiphertextBlob"].hex(),
-                    "key_id": response["KeyId"],
-                }
-            }
-        elif operation == "encrypt":
-            response = kms_client.encrypt(
-                KeyId=data.get("key_id", ""),
-                Plaintext=bytes.fromhex(data.get("plaintext", "")),
-            )
-            return {
-                "result": {
-                    "ciphertext_blob": response["CiphertextBlob"].hex(),
-                    "key_id": response["KeyId"],
-                }
-            }
-        else:
-            return {"error": f"Unsupported KMS operation: {operation}"}
-
+        return kms_handler(_get_kms_client(), payload.get("data", {}))
     except Exception as e:
         return {"error": f"KMS error: {e}"}
 
 
-def handle_connection(conn, addr, cw_logger):
-    """Handle a single vsock connection from the enclave proxy."""
-    cw_logger.write("system", f"Enclave connected from CID {addr}")
+class ShardedPool:
+    """Fixed pool of worker threads, each draining its own queue.
 
-    try:
+    Work is sharded by request id so workers never contend on a single shared
+    queue, while frames for the same request id stay ordered.
+    """
+
+    def __init__(self, workers=8):
+        self._queues = [queue.SimpleQueue() for _ in range(workers)]
+        for work_queue in self._queues:
+            t = threading.Thread(
+                target=self._worker, args=(work_queue,), daemon=True
+            )
+            t.start()
+
+    def submit(self, key, task):
+        self._queues[hash(key) % len(self._queues)].put(task)
+
+    def _worker(self, work_queue):
         while True:
-            msg = recv_message(conn)
-            if msg is None:
-                break
+            task = work_queue.get()
+            try:
+                task()
+            except Exception as e:
+                log.warning(f"Worker error: {e}")
 
-            msg_type = msg.get("type", "")
-            msg_id = msg.get("id", "")
-            payload = msg.get("payload", {})
-
-            if msg_type == "handshake":
-                enclave_id = payload.get("enclave_id", "unknown")
-                protocol = payload.get("protocol_version", "unknown")
-                capabilities = payload.get("capabilities", [])
-                cw_logger.write(
-                    "system",
-                    f"Handshake from {enclave_id}: protocol={protocol}, "
-                    f"capabilities={capabilities}",
-                )
-                send_message(conn, {
-                    "type": "handshake_ack",
-                    "id": msg_id,
-                    "payload": {"status": "ok", "parent_version": "2.0"},
-                })
-
-            elif msg_type == "log":
-                level = payload.get("level", "info")
-                message = payload.get("message", "")
-                stream = "application" if level.startswith("app") else "system"
-                cw_logger.write(stream, f"[{level.upper()}] {message}")
-
-            elif msg_type == "http_request":
-                result = handle_http_request(payload)
-                send_message(conn, {
-                    "type": "http_response",
-                    "id": msg_id,
-                    "payload": result,
-                })
-
-            elif msg_type == "kms_request":
-                result = handle_kms_request(payload)
-                send_message(conn, {
-                    "type": "kms_response",
-                    "id": msg_id,
-                    "payload": result,
-                })
-
-            elif msg_type == "pcr_request":
-                pcr_values = get_pcr_values()
-                cw_logger.write(
-                    "system",
-                    f"PCR values: {json.dumps(pcr_values)}",
-                )
-                send_message(conn, {
-                    "type": "pcr_response",
-                    "id": msg_id,
-                    "payload": {"pcr_values": pcr_values},
-                })
-
-            elif msg_type == "health_report":
-                status = payload.get("status", "unknown")
-                exit_code = payload.get("exit_code")
-                wtype = payload.get("workload_type", "unknown")
-                msg_text = f"Health: status={status}, workload={wtype}"
-                if exit_code is not None:
-                    msg_text += f", exit_code={exit_code}"
-                cw_logger.write("health", msg_text)
-
-            else:
-                cw_logger.write("system", f"Unknown message type: {msg_type}")
-                send_message(conn, {
-                    "type": "error",
-                    "id": msg_id,
-                    "payload": {"error": f"Unknown message type: {msg_type}"},
-                })
 
-    except Exception as e:
-        cw_logger.write("errors", f"Connection error: {e}")
-    finally:
-        conn.close()
+_work_pool = ShardedPool()
+
+
+class ConnState:
+    """Per-connection receive buffer and write serialization."""
+
+    def __init__(self, conn, addr):
+        self.conn = conn
+        self.addr = addr
+        self.buf = bytearray()
+        self.write_lock = threading.Lock()
+
+    def reply(self, message):
+        with self.write_lock:
+            send_message(self.conn, message)
+
+    def extract_frames(self, data):
+        """Append received bytes and yield every complete frame payload."""
+        self.buf.extend(data)
+        while len(self.buf) >= 4:
+            length = _HEADER_STRUCT.unpack_from(self.buf)[0]
+            if length > 10 * 1024 * 1024:
+                raise ValueError(f"Message too large: {length} bytes")
+            if len(self.buf) < 4 + length:
+                break
+            payload = bytes(self.buf[4:4 + length])
+            del self.buf[:4 + length]
+            yield _decode_frame(payload)
+
+
+def process_message(state, msg, cw_logger):
+    """Dispatch one decoded frame from an enclave connection.
+
+    Cheap bookkeeping frames (handshake, log, health) are handled inline on
+    the dispatcher thread; blocking upstream work (HTTP, KMS, PCR) goes to
+    the sharded worker pool so concurrent requests from one enclave fan out
+    instead of serializing behind each other.
+    """
+    reply = state.reply
+    msg_type = msg.get("type", "")
+    msg_id = msg.get("id", "")
+    payload = msg.get("payload", {})
+
+    if msg_type == "handshake":
+        enclave_id = payload.get("enclave_id", "unknown")
+        protocol = payload.get("protocol_version", "unknown")
+        capabilities = payload.get("capabilities", [])
+        cw_logger.write(
+            "system",
+            f"Handshake from {enclave_id}: protocol={protocol}, "
+            f"capabilities={capabilities}",
+        )
+        reply({
+            "type": "handshake_ack",
+            "id": msg_id,
+            "payload": {"status": "ok", "parent_version": "2.0"},
+        })
+
+    elif msg_type == "log":
+        level = payload.get("level", "info")
+        message = payload.get("message", "")
+        stream = "application" if level.startswith("app") else "system"
+        cw_logger.write(stream, f"[{level.upper()}] {message}")
+
+    elif msg_type == "http_request":
+        def http_task(msg_id=msg_id, payload=payload):
+            handle_http_request_streaming(reply, msg_id, payload)
+        _work_pool.submit(msg_id, http_task)
+
+    elif msg_type == "kms_request":
+        def kms_task(msg_id=msg_id, payload=payload):
+            reply({
+                "type": "kms_response",
+                "id": msg_id,
+                "payload": handle_kms_request(payload),
+            })
+        _work_pool.submit(msg_id, kms_task)
+
+    elif msg_type == "pcr_request":
+        def pcr_task(msg_id=msg_id):
+            pcr_values = get_pcr_values()
+            cw_logger.write(
+                "system",
+                f"PCR values: {json.dumps(pcr_values)}",
+            )
+            reply({
+                "type": "pcr_response",
+                "id": msg_id,
+                "payload": {"pcr_values": pcr_values},
+            })
+        _work_pool.submit(msg_id, pcr_task)
+
+    elif msg_type == "health_report":
+        status = payload.get("status", "unknown")
+        exit_code = payload.get("exit_code")
+        wtype = payload.get("workload_type", "unknown")
+        msg_text = f"Health: status={status}, workload={wtype}"
+        if exit_code is not None:
+            msg_text += f", exit_code={exit_code}"
+        cw_logger.write("health", msg_text)
+
+    else:
+        cw_logger.write("system", f"Unknown message type: {msg_type}")
+        reply({
+            "type": "error",
+            "id": msg_id,
+            "payload": {"error": f"Unknown message type: {msg_type}"},
+        })
+
+
+def serve(sock, cw_logger):
+    """Single-thread selector loop multiplexing accept plus all connections.
+
+    One dispatcher thread blocks in the selector instead of one thread per
+    enclave; readiness events drive frame parsing, and the worker pool
+    carries anything that blocks. Connections stay in blocking mode — after
+    a readiness event one recv returns whatever is available, and worker
+    threads can still write replies with plain blocking sends.
+    """
+    selector = selectors.DefaultSelector()
+    selector.register(sock, selectors.EVENT_READ, None)
+
+    def close_connection(state):
+        selector.unregister(state.conn)
+        state.conn.close()
         cw_logger.write("system", "Enclave connection closed")
 
+    while True:
+        for key, _ in selector.select():
+            if key.data is None:
+                conn, addr = sock.accept()
+                # Match the enclave side: 1 MiB buffers so multi-megabyte
+                # HTTP bodies stream without blocking on the default vsock
+                # buffer.
+                conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+                conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+                cw_logger.write("system", f"Connection accepted from {addr}")
+                state = ConnState(conn, addr)
+                selector.register(conn, selectors.EVENT_READ, state)
+                continue
+
+            state = key.data
+            try:
+                data = state.conn.recv(65536)
+            except OSError as e:
+                cw_logger.write("errors", f"Connection error: {e}")
+                close_connection(state)
+                continue
+            if not data:
+                close_connection(state)
+                continue
+            try:
+                for msg in state.extract_frames(data):
+                    process_message(state, msg, cw_logger)
+            except Exception as e:
+                cw_logger.write("errors", f"Connection error: {e}")
+                close_connection(state)
+
 
 def main():
     if len(sys.argv) < 2:
@@ -362,16 +724,7 @@ def main():
         sock.bind((VMADDR_CID_ANY, VSOCK_PORT))
         sock.listen(5)
         cw_logger.write("system", f"Listening on vsock port {VSOCK_PORT}")
-
-        while True:
-            conn, addr = sock.accept()
-            cw_logger.write("system", f"Connection accepted from {addr}")
-            t = threading.Thread(
-                target=handle_connection,
-                args=(conn, addr, cw_logger),
-                daemon=True,
-            )
-            t.start()
+        serve(sock, cw_logger)
 
     except Exception as e:
         cw_logger.write("errors", f"Parent proxy failed: {e}")
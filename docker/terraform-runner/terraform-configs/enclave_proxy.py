@@ -1,5 +1,13 @@
-import socket,json,struct,sys,os,time,signal,subprocess,threading
-from http.server import HTTPServer,BaseHTTPRequestHandler
+import socket,json,struct,sys,os,time,signal,subprocess,threading,base64,itertools,select,shlex
+try:
+    import orjson
+    _dumps=orjson.dumps
+    _loads=orjson.loads
+except ImportError:
+    _dumps=lambda o:json.dumps(o).encode("utf-8")
+    _loads=json.loads
+from concurrent.futures import Future,TimeoutError as FutureTimeout
+from http.server import ThreadingHTTPServer,BaseHTTPRequestHandler
 from urllib.parse import urlparse
 
 VMADDR_CID_HOST=3
@@ -7,64 +15,74 @@ VSOCK_PORT=5000
 HTTP_PROXY_PORT=3128
 KMS_PROXY_PORT=8000
 HEALTH_CHECK_PORT=8888
+_PROXY_URL=f"http://127.0.0.1:{HTTP_PROXY_PORT}"
+_PROXY_ENV_OVERLAY={"HTTP_PROXY":_PROXY_URL,"HTTPS_PROXY":_PROXY_URL,"http_proxy":_PROXY_URL,"https_proxy":_PROXY_URL,"TREZA_KMS_ENDPOINT":f"http://127.0.0.1:{KMS_PROXY_PORT}","NO_PROXY":"127.0.0.1,localhost","no_proxy":"127.0.0.1,localhost"}
 
 _vsock_lock=threading.Lock()
 _vsock_conn=None
-_request_id_counter=0
+_id_counter=itertools.count(1)
 _pending_responses={}
-_pending_lock=threading.Lock()
 _shutdown_event=threading.Event()
 
 def next_request_id():
-    global _request_id_counter
-    with _vsock_lock:
-        _request_id_counter+=1
-        return f"req-{_request_id_counter}"
+    # itertools.count.__next__ is atomic under the GIL; no lock needed
+    return f"req-{next(_id_counter)}"
+
+_HDR=struct.Struct("!I")
+_hdr_buf=bytearray(4)
 
 def send_message(sock,message):
-    payload=json.dumps(message).encode("utf-8")
-    header=struct.pack("!I",len(payload))
-    with _vsock_lock:
-        sock.sendall(header+payload)
+    _send_frame(sock,_dumps(message))
 
 def recv_message(sock):
     header=_recv_exact(sock,4)
     if not header:return None
-    length=struct.unpack("!I",header)[0]
+    length=_HDR.unpack(header)[0]
     if length>10*1024*1024:raise ValueError(f"Message too large: {length}")
     payload=_recv_exact(sock,length)
     if not payload:return None
-    return json.loads(payload.decode("utf-8"))
+    return _loads(payload)
 
 def _recv_exact(sock,n):
-    data=b""
-    while len(data)<n:
-        chunk=sock.recv(n-len(data))
-        if not chunk:return None
-        data+=chunk
-    return data
+    buf=bytearray(n)
+    mv=memoryview(buf)
+    off=0
+    while off<n:
+        r=sock.recv_into(mv[off:],n-off)
+        if not r:return None
+        off+=r
+    return buf
+
+_LOG_PREFIX=b'{"type":"log","id":"'
+_LOG_INFIX=b'","payload":'
+
+def _send_frame(sock,payload):
+    with _vsock_lock:
+        _HDR.pack_into(_hdr_buf,0,len(payload))
+        sent=sock.sendmsg([_hdr_buf,payload])
+        total=4+len(payload)
+        if sent<total:sock.sendall((bytes(_hdr_buf)+payload)[sent:])
 
 def send_log(level,message):
     global _vsock_conn
     if _vsock_conn:
         try:
-            send_message(_vsock_conn,{"type":"log","id":next_request_id(),"payload":{"level":level,"message":message,"timestamp":time.time()}})
+            body=_dumps({"level":level,"message":message,"timestamp":time.time()})
+            _send_frame(_vsock_conn,b"".join([_LOG_PREFIX,next_request_id().encode("ascii"),_LOG_INFIX,body,b"}"]))
         except:pass
     print(f"[ENCLAVE-PROXY] [{level.upper()}] {message}",flush=True)
 
 def send_request_and_wait(msg_type,payload,timeout=30):
     global _vsock_conn
     req_id=next_request_id()
-    event=threading.Event()
-    with _pending_lock:
-        _pending_responses[req_id]={"event":event,"response":None}
+    fut=Future()
+    _pending_responses[req_id]=fut
     send_message(_vsock_conn,{"type":msg_type,"id":req_id,"payload":payload})
-    if not event.wait(timeout=timeout):
-        with _pending_lock:_pending_responses.pop(req_id,None)
+    try:
+        return fut.result(timeout=timeout)
+    except FutureTimeout:
+        _pending_responses.pop(req_id,None)
         raise TimeoutError(f"Request {req_id} timed out")
-    with _pending_lock:
-        result=_pending_responses.pop(req_id)
-    return result["response"]
 
 def response_dispatcher():
     global _vsock_conn
@@ -77,15 +95,16 @@ def response_dispatcher():
                 break
             req_id=msg.get("id")
             if req_id:
-                with _pending_lock:
-                    if req_id in _pending_responses:
-                        _pending_responses[req_id]["response"]=msg
-                        _pending_responses[req_id]["event"].set()
+                fut=_pending_responses.pop(req_id,None)
+                if fut:fut.set_result(msg)
         except Exception as e:
             if not _shutdown_event.is_set():
                 send_log("error",f"Dispatcher error: {e}")
                 time.sleep(1)
 
+_HOP_HEADERS=frozenset({"host","proxy-connection","proxy-authorization","connection","keep-alive","te","trailers","upgrade"})
+_RESP_SKIP_HEADERS=frozenset({"transfer-encoding","content-length","connection"})
+
 class HTTPProxyHandler(BaseHTTPRequestHandler):
     def do_GET(self):self._proxy("GET")
     def do_POST(self):self._proxy("POST")
@@ -98,15 +117,15 @@ class HTTPProxyHandler(BaseHTTPRequestHandler):
         try:
             cl=int(self.headers.get("Content-Length",0))
             body=self.rfile.read(cl) if cl>0 else b""
-            hdrs={k:v for k,v in self.headers.items() if k.lower() not in ("host","proxy-connection","proxy-authorization")}
-            resp=send_request_and_wait("http_request",{"method":method,"url":self.path,"headers":hdrs,"body":body.decode("utf-8",errors="replace") if body else ""},timeout=60)
+            hdrs={k:v for k,v in self.headers.items() if k.lower() not in _HOP_HEADERS}
+            resp=send_request_and_wait("http_request",{"method":method,"url":self.path,"headers":hdrs,"body_b64":base64.b64encode(body).decode("ascii") if body else ""},timeout=60)
             rp=resp.get("payload",{})
             status=rp.get("status",502)
             rh=rp.get("headers",{})
-            rb=rp.get("body","").encode("utf-8")
+            rb=base64.b64decode(rp["body_b64"]) if "body_b64" in rp else rp.get("body","").encode("utf-8")
             self.send_response(status)
             for k,v in rh.items():
-                if k.lower() not in ("transfer-encoding","content-length"):self.send_header(k,v)
+                if k.lower() not in _RESP_SKIP_HEADERS:self.send_header(k,v)
             self.send_header("Content-Length",str(len(rb)))
             self.end_headers()
             self.wfile.write(rb)
@@ -146,36 +165,88 @@ class HealthHandler(BaseHTTPRequestHandler):
         self.wfile.write(body)
     def log_message(self,fmt,*args):pass
 
+_servers=[]
+
 def run_server(port,handler):
-    srv=HTTPServer(("127.0.0.1",port),handler)
-    srv.timeout=1
-    while not _shutdown_event.is_set():srv.handle_request()
+    srv=ThreadingHTTPServer(("127.0.0.1",port),handler)
+    srv.daemon_threads=True
+    _servers.append(srv)
+    srv.serve_forever()
     srv.server_close()
 
-def stream_output(proc,name):
-    stream=proc.stdout if name=="stdout" else proc.stderr
-    if not stream:return
-    for line in iter(stream.readline,b""):
-        if _shutdown_event.is_set():break
-        decoded=line.decode("utf-8",errors="replace").rstrip("\n")
-        if decoded:send_log("app" if name=="stdout" else "app_err",decoded)
+def shutdown_servers():
+    for srv in _servers:
+        try:srv.shutdown()
+        except:pass
+
+_BATCH_MAX_LINES=64
+_BATCH_WINDOW=0.01
+_IDLE_TIMEOUT=1.0
 
-def connect_to_parent(max_retries=30,retry_delay=10):
+def _flush_lines(level,lines):
+    if not lines:return
+    global _vsock_conn
+    if _vsock_conn:
+        try:send_message(_vsock_conn,{"type":"log_batch","id":next_request_id(),"payload":{"level":level,"lines":lines,"timestamp":time.time()}})
+        except:pass
+    print("\n".join(f"[ENCLAVE-PROXY] [{level.upper()}] {l}" for l in lines),flush=True)
+    lines.clear()
+
+def stream_output(proc):
+    # one thread drains both pipes via select instead of a blocked
+    # readline thread per stream
+    states={}
+    for stream,level in ((proc.stdout,"app"),(proc.stderr,"app_err")):
+        if stream:
+            fd=stream.fileno()
+            os.set_blocking(fd,False)
+            states[fd]={"level":level,"buf":b"","lines":[]}
+    last=time.monotonic()
+    while states and not _shutdown_event.is_set():
+        # the short batching window only applies while lines are queued;
+        # block near-indefinitely when the app is silent
+        pending=any(st["lines"] for st in states.values())
+        ready,_,_=select.select(list(states),[],[],_BATCH_WINDOW if pending else _IDLE_TIMEOUT)
+        for fd in ready:
+            st=states[fd]
+            try:chunk=os.read(fd,65536)
+            except BlockingIOError:continue
+            except OSError:chunk=b""  # EIO etc. on process teardown: treat as EOF
+            if chunk==b"":
+                if st["buf"]:st["lines"].append(st["buf"].decode("utf-8",errors="replace"))
+                _flush_lines(st["level"],st["lines"])
+                del states[fd]
+                continue
+            parts=(st["buf"]+chunk).split(b"\n")
+            st["buf"]=parts.pop()
+            st["lines"].extend(p.decode("utf-8",errors="replace") for p in parts if p)
+        now=time.monotonic()
+        for st in states.values():
+            if st["lines"] and (len(st["lines"])>=_BATCH_MAX_LINES or now-last>=_BATCH_WINDOW):
+                _flush_lines(st["level"],st["lines"])
+        if now-last>=_BATCH_WINDOW:last=now
+    for st in states.values():
+        if st["buf"]:st["lines"].append(st["buf"].decode("utf-8",errors="replace"))
+        _flush_lines(st["level"],st["lines"])
+
+def connect_to_parent(max_retries=30):
     global _vsock_conn
     print("[ENCLAVE-PROXY] Waiting for parent proxy...",flush=True)
-    time.sleep(5)
     for attempt in range(1,max_retries+1):
+        # try immediately; back off exponentially (capped at 10s) only on failure
+        delay=min(10,0.25*(2**attempt))
         try:
             sock=socket.socket(socket.AF_VSOCK,socket.SOCK_STREAM)
-            sock.settimeout(120)
+            sock.settimeout(min(2,max(delay,0.5)))
             sock.connect((VMADDR_CID_HOST,VSOCK_PORT))
+            sock.settimeout(120)
             _vsock_conn=sock
             send_message(sock,{"type":"handshake","id":next_request_id(),"payload":{"enclave_id":os.environ.get("ENCLAVE_ID","unknown"),"protocol_version":"2.0","capabilities":["http_proxy","kms_proxy","log_stream","health"]}})
             print(f"[ENCLAVE-PROXY] Connected on attempt {attempt}",flush=True)
             return True
         except Exception as e:
             print(f"[ENCLAVE-PROXY] Attempt {attempt}/{max_retries} failed: {e}",flush=True)
-            if attempt<max_retries:time.sleep(retry_delay)
+            if attempt<max_retries:time.sleep(delay)
     return False
 
 def main():
@@ -208,24 +279,22 @@ def main():
 
     user_proc=None
     if user_cmd:
-        env=os.environ.copy()
-        env["HTTP_PROXY"]=f"http://127.0.0.1:{HTTP_PROXY_PORT}"
-        env["HTTPS_PROXY"]=f"http://127.0.0.1:{HTTP_PROXY_PORT}"
-        env["http_proxy"]=f"http://127.0.0.1:{HTTP_PROXY_PORT}"
-        env["https_proxy"]=f"http://127.0.0.1:{HTTP_PROXY_PORT}"
-        env["TREZA_KMS_ENDPOINT"]=f"http://127.0.0.1:{KMS_PROXY_PORT}"
-        env["NO_PROXY"]="127.0.0.1,localhost"
-        env["no_proxy"]="127.0.0.1,localhost"
+        env={**os.environ,**_PROXY_ENV_OVERLAY}
         send_log("info",f"Starting user application: {user_cmd}")
-        user_proc=subprocess.Popen(user_cmd,shell=True,stdout=subprocess.PIPE,stderr=subprocess.PIPE,env=env)
-        threading.Thread(target=stream_output,args=(user_proc,"stdout"),daemon=True).start()
-        threading.Thread(target=stream_output,args=(user_proc,"stderr"),daemon=True).start()
+        use_shell=any(ch in user_cmd for ch in "|&;<>$`\\\n\"'*?~#()")
+        args=user_cmd
+        if not use_shell:
+            try:args=shlex.split(user_cmd)
+            except ValueError:use_shell=True;args=user_cmd
+        user_proc=subprocess.Popen(args,shell=use_shell,stdout=subprocess.PIPE,stderr=subprocess.PIPE,bufsize=0,env=env)
+        threading.Thread(target=stream_output,args=(user_proc,),daemon=True).start()
     else:
         send_log("warn","No user command configured; running in standalone mode")
 
     def on_signal(signum,frame):
         send_log("info",f"Signal {signum}, shutting down...")
         _shutdown_event.set()
+        shutdown_servers()
         if user_proc and user_proc.poll() is None:user_proc.terminate()
     signal.signal(signal.SIGTERM,on_signal)
     signal.signal(signal.SIGINT,on_signal)
@@ -239,17 +308,21 @@ def main():
             _shutdown_event.set()
         elif wtype in ("service","daemon"):
             hi=int(os.environ.get("TREZA_HEALTH_INTERVAL","30"))
+            # running reports are identical except for the id; serialize once
+            hr_prefix=b'{"type":"health_report","id":"'
+            hr_body=b'","payload":'+_dumps({"status":"running","workload_type":wtype})+b"}"
             while not _shutdown_event.is_set():
                 if user_proc.poll() is not None:
                     ec=user_proc.returncode
                     send_log("error",f"Service exited unexpectedly with code {ec}")
                     send_message(_vsock_conn,{"type":"health_report","id":next_request_id(),"payload":{"status":"crashed","exit_code":ec,"workload_type":wtype}})
                     break
-                try:send_message(_vsock_conn,{"type":"health_report","id":next_request_id(),"payload":{"status":"running","workload_type":wtype}})
+                try:_send_frame(_vsock_conn,b"".join([hr_prefix,next_request_id().encode("ascii"),hr_body]))
                 except:pass
                 _shutdown_event.wait(timeout=hi)
     else:
         while not _shutdown_event.is_set():_shutdown_event.wait(timeout=30)
+    shutdown_servers()
     send_log("info","Enclave proxy shutting down")
 
 if __name__=="__main__":main()
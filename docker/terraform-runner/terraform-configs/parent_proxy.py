@@ -1,9 +1,22 @@
-import socket,json,struct,sys,os,time,threading,subprocess,logging
+import socket,json,struct,sys,os,time,threading,subprocess,logging,base64,selectors
+from concurrent.futures import ThreadPoolExecutor
 try:
     import boto3
 except ImportError:
     boto3=None
 import urllib.request,urllib.error
+try:
+    import urllib3
+    _http_pool=urllib3.PoolManager(num_pools=32,maxsize=64,retries=False,timeout=urllib3.Timeout(connect=5.0,read=55.0))
+except ImportError:
+    _http_pool=None
+try:
+    import orjson
+    _dumps=orjson.dumps
+    _loads=orjson.loads
+except ImportError:
+    _dumps=lambda o:json.dumps(o).encode("utf-8")
+    _loads=json.loads
 
 VMADDR_CID_ANY=0xFFFFFFFF
 VSOCK_PORT=5000
@@ -11,17 +24,22 @@ logging.basicConfig(level=logging.INFO,format="%(asctime)s [PARENT] %(levelname)
 log=logging.getLogger("parent-proxy")
 
 class CloudWatchLogger:
+    FLUSH_INTERVAL=0.5
+    MAX_BATCH_EVENTS=100
     def __init__(self,enclave_id,region=None):
         self.enclave_id=enclave_id
         self.region=region or os.environ.get("AWS_DEFAULT_REGION","us-west-2")
         self.client=None
         self.log_group=f"/aws/ec2/enclave/{enclave_id}"
         self.log_streams={}
+        self._buffers={}
+        self._tokens={}
         self._lock=threading.Lock()
         if boto3:
             try:
                 self.client=boto3.client("logs",region_name=self.region)
                 self._ensure_log_group()
+                threading.Thread(target=self._flush_loop,daemon=True).start()
             except Exception as e:
                 log.warning(f"CloudWatch init failed: {e}")
     def _ensure_log_group(self):
@@ -36,40 +54,86 @@ class CloudWatchLogger:
         log.info(f"[{stream_name}] {message}")
         if not self.client:return
         with self._lock:
+            self._buffers.setdefault(stream_name,[]).append({"timestamp":int(time.time()*1000),"message":message})
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.FLUSH_INTERVAL)
+            self.flush()
+    def flush(self):
+        # swap buffers out under the lock; network I/O happens outside it so
+        # a slow put_log_events never blocks write() callers
+        with self._lock:
+            pending={s:e for s,e in self._buffers.items() if e}
+            for s in pending:self._buffers[s]=[]
+        for stream_name,events in pending.items():
+            for start in range(0,len(events),self.MAX_BATCH_EVENTS):
+                self._put_events(stream_name,events[start:start+self.MAX_BATCH_EVENTS])
+    def _fetch_token(self,stream_name):
+        resp=self.client.describe_log_streams(logGroupName=self.log_group,logStreamNamePrefix=stream_name)
+        if resp["logStreams"]:return resp["logStreams"][0].get("uploadSequenceToken")
+        return None
+    def _put_events(self,stream_name,events):
+        try:
+            self._ensure_log_stream(stream_name)
+            kwargs={"logGroupName":self.log_group,"logStreamName":stream_name,"logEvents":events}
+            token=self._tokens.get(stream_name)
+            if token:kwargs["sequenceToken"]=token
             try:
-                self._ensure_log_stream(stream_name)
-                resp=self.client.describe_log_streams(logGroupName=self.log_group,logStreamNamePrefix=stream_name)
-                kwargs={"logGroupName":self.log_group,"logStreamName":stream_name,"logEvents":[{"timestamp":int(time.time()*1000),"message":message}]}
-                if resp["logStreams"]:
-                    token=resp["logStreams"][0].get("uploadSequenceToken")
-                    if token:kwargs["sequenceToken"]=token
-                self.client.put_log_events(**kwargs)
-            except Exception as e:
-                log.warning(f"CloudWatch write error: {e}")
+                resp=self.client.put_log_events(**kwargs)
+            except self.client.exceptions.InvalidSequenceTokenException:
+                token=self._fetch_token(stream_name)
+                if token:kwargs["sequenceToken"]=token
+                else:kwargs.pop("sequenceToken",None)
+                resp=self.client.put_log_events(**kwargs)
+            self._tokens[stream_name]=resp.get("nextSequenceToken")
+        except Exception as e:
+            log.warning(f"CloudWatch write error: {e}")
+
+_HDR=struct.Struct("!I")
+_tls=threading.local()
 
 def send_message(conn,message):
-    payload=json.dumps(message).encode("utf-8")
-    header=struct.pack("!I",len(payload))
-    conn.sendall(header+payload)
+    payload=_dumps(message)
+    hdr=getattr(_tls,"hdr_buf",None)
+    if hdr is None:hdr=_tls.hdr_buf=bytearray(4)
+    _HDR.pack_into(hdr,0,len(payload))
+    sent=conn.sendmsg([hdr,payload])
+    total=4+len(payload)
+    if sent<total:conn.sendall((bytes(hdr)+payload)[sent:])
 
 def recv_message(conn):
     header=_recv_exact(conn,4)
     if not header:return None
-    length=struct.unpack("!I",header)[0]
+    length=_HDR.unpack(header)[0]
     if length>10*1024*1024:raise ValueError(f"Message too large: {length}")
     payload=_recv_exact(conn,length)
     if not payload:return None
-    return json.loads(payload.decode("utf-8"))
+    return _loads(payload)
 
 def _recv_exact(conn,n):
-    data=b""
-    while len(data)<n:
-        chunk=conn.recv(n-len(data))
-        if not chunk:return None
-        data+=chunk
-    return data
+    buf=bytearray(n)
+    mv=memoryview(buf)
+    off=0
+    while off<n:
+        r=conn.recv_into(mv[off:],n-off)
+        if not r:return None
+        off+=r
+    return buf
+
+_pcr_cache=None
+_pcr_lock=threading.Lock()
 
 def get_pcr_values():
+    # PCRs are immutable for a running enclave; cache the first good read
+    global _pcr_cache
+    if _pcr_cache is not None:return _pcr_cache
+    with _pcr_lock:
+        if _pcr_cache is not None:return _pcr_cache
+        pcrs=_query_pcr_values()
+        if pcrs is not None:_pcr_cache=pcrs
+        return pcrs if pcrs is not None else {"PCR0":"ERROR_NSM_UNAVAILABLE","PCR1":"ERROR_NSM_UNAVAILABLE","PCR2":"ERROR_NSM_UNAVAILABLE"}
+
+def _query_pcr_values():
     try:
         result=subprocess.run(["/usr/bin/nitro-cli","describe-enclaves"],capture_output=True,text=True,timeout=30)
         if result.returncode==0 and result.stdout.strip():
@@ -81,30 +145,57 @@ def get_pcr_values():
         log.warning("Timeout getting PCRs")
     except Exception as e:
         log.warning(f"Error getting PCRs: {e}")
-    return {"PCR0":"ERROR_NSM_UNAVAILABLE","PCR1":"ERROR_NSM_UNAVAILABLE","PCR2":"ERROR_NSM_UNAVAILABLE"}
+    return None
+
+def _request_body(payload):
+    b64=payload.get("body_b64")
+    if b64:return base64.b64decode(b64)
+    body=payload.get("body","")
+    return body.encode("utf-8") if body else None
+
+def _response_fields(data):
+    # the Rust enclave proxy deployed by user_data.sh reads only the legacy
+    # text "body"; keep emitting it alongside body_b64 so binary-aware peers
+    # get exact bytes while older peers still see a body at all
+    return {"body":data.decode("utf-8",errors="replace"),"body_b64":base64.b64encode(data).decode("ascii")}
 
 def handle_http_request(payload):
     method=payload.get("method","GET")
     url=payload.get("url","")
     headers=payload.get("headers",{})
-    body=payload.get("body","")
+    if _http_pool:
+        try:
+            r=_http_pool.request(method,url,body=_request_body(payload),headers=headers,redirect=False)
+            return {"status":r.status,"headers":dict(r.headers),**_response_fields(r.data)}
+        except Exception as e:
+            return {"status":502,"headers":{},"body":f"Proxy error: {e}"}
     try:
-        req=urllib.request.Request(url,data=body.encode("utf-8") if body else None,headers=headers,method=method)
+        req=urllib.request.Request(url,data=_request_body(payload),headers=headers,method=method)
         with urllib.request.urlopen(req,timeout=55) as response:
-            return {"status":response.status,"headers":dict(response.getheaders()),"body":response.read().decode("utf-8",errors="replace")}
+            return {"status":response.status,"headers":dict(response.getheaders()),**_response_fields(response.read())}
     except urllib.error.HTTPError as e:
-        return {"status":e.code,"headers":dict(e.headers) if e.headers else {},"body":e.read().decode("utf-8",errors="replace") if e.fp else ""}
+        return {"status":e.code,"headers":dict(e.headers) if e.headers else {},**_response_fields(e.read() if e.fp else b"")}
     except urllib.error.URLError as e:
         return {"status":502,"headers":{},"body":f"Network error: {e.reason}"}
     except Exception as e:
         return {"status":502,"headers":{},"body":f"Proxy error: {e}"}
 
+_kms_client=None
+_kms_lock=threading.Lock()
+
+def _get_kms():
+    global _kms_client
+    if _kms_client is None:
+        with _kms_lock:
+            if _kms_client is None:_kms_client=boto3.client("kms",region_name=os.environ.get("AWS_DEFAULT_REGION","us-west-2"))
+    return _kms_client
+
 def handle_kms_request(payload):
     if not boto3:return {"error":"boto3 not available"}
     operation=payload.get("operation","")
     data=payload.get("data",{})
     try:
-        kms=boto3.client("kms",region_name=os.environ.get("AWS_DEFAULT_REGION","us-west-2"))
+        kms=_get_kms()
         if operation=="decrypt":
             r=kms.decrypt(CiphertextBlob=bytes.fromhex(data.get("ciphertext","")),KeyId=data.get("key_id",""))
             return {"result":{"plaintext":r["Plaintext"].hex(),"key_id":r["KeyId"]}}
@@ -119,48 +210,91 @@ def handle_kms_request(payload):
     except Exception as e:
         return {"error":f"KMS error: {e}"}
 
-def handle_connection(conn,addr,cw):
-    cw.write("system",f"Enclave connected from CID {addr}")
-    try:
-        while True:
-            msg=recv_message(conn)
-            if msg is None:break
-            t=msg.get("type","")
-            mid=msg.get("id","")
-            p=msg.get("payload",{})
-            if t=="handshake":
-                cw.write("system",f"Handshake: enclave={p.get('enclave_id')}, proto={p.get('protocol_version')}, caps={p.get('capabilities')}")
-                send_message(conn,{"type":"handshake_ack","id":mid,"payload":{"status":"ok","parent_version":"2.0"}})
-            elif t=="log":
-                level=p.get("level","info")
-                message=p.get("message","")
-                stream="application" if level.startswith("app") else "system"
-                cw.write(stream,f"[{level.upper()}] {message}")
-            elif t=="http_request":
-                result=handle_http_request(p)
-                send_message(conn,{"type":"http_response","id":mid,"payload":result})
-            elif t=="kms_request":
-                result=handle_kms_request(p)
-                send_message(conn,{"type":"kms_response","id":mid,"payload":result})
-            elif t=="pcr_request":
-                pcrs=get_pcr_values()
-                cw.write("system",f"PCR values: {json.dumps(pcrs)}")
-                send_message(conn,{"type":"pcr_response","id":mid,"payload":{"pcr_values":pcrs}})
-            elif t=="health_report":
-                status=p.get("status","unknown")
-                ec=p.get("exit_code")
-                wt=p.get("workload_type","unknown")
-                msg_text=f"Health: status={status}, workload={wt}"
-                if ec is not None:msg_text+=f", exit_code={ec}"
-                cw.write("health",msg_text)
-            else:
-                cw.write("system",f"Unknown message type: {t}")
-                send_message(conn,{"type":"error","id":mid,"payload":{"error":f"Unknown: {t}"}})
-    except Exception as e:
-        cw.write("errors",f"Connection error: {e}")
-    finally:
-        conn.close()
-        cw.write("system","Connection closed")
+class ConnState:
+    def __init__(self,conn,addr):
+        self.conn=conn
+        self.addr=addr
+        self.buf=bytearray()
+        self.write_lock=threading.Lock()
+    def reply(self,message):
+        with self.write_lock:send_message(self.conn,message)
+    def extract_frames(self,data):
+        self.buf+=data
+        frames=[]
+        while len(self.buf)>=4:
+            length=_HDR.unpack_from(self.buf)[0]
+            if length>10*1024*1024:raise ValueError(f"Message too large: {length}")
+            if len(self.buf)<4+length:break
+            frames.append(_loads(bytes(self.buf[4:4+length])))
+            del self.buf[:4+length]
+        return frames
+
+_work_pool=ThreadPoolExecutor(max_workers=32)
+
+def process_message(state,msg,cw):
+    t=msg.get("type","")
+    mid=msg.get("id","")
+    p=msg.get("payload",{})
+    if t=="handshake":
+        cw.write("system",f"Handshake: enclave={p.get('enclave_id')}, proto={p.get('protocol_version')}, caps={p.get('capabilities')}")
+        state.reply({"type":"handshake_ack","id":mid,"payload":{"status":"ok","parent_version":"2.0"}})
+    elif t=="log":
+        level=p.get("level","info")
+        stream="application" if level.startswith("app") else "system"
+        cw.write(stream,f"[{level.upper()}] {p.get('message','')}")
+    elif t=="log_batch":
+        level=p.get("level","info")
+        stream="application" if level.startswith("app") else "system"
+        prefix=f"[{level.upper()}] "
+        for line in p.get("lines",[]):cw.write(stream,prefix+line)
+    elif t=="http_request":
+        _work_pool.submit(lambda:state.reply({"type":"http_response","id":mid,"payload":handle_http_request(p)}))
+    elif t=="kms_request":
+        _work_pool.submit(lambda:state.reply({"type":"kms_response","id":mid,"payload":handle_kms_request(p)}))
+    elif t=="pcr_request":
+        def pcr_task():
+            pcrs=get_pcr_values()
+            cw.write("system",f"PCR values: {json.dumps(pcrs)}")
+            state.reply({"type":"pcr_response","id":mid,"payload":{"pcr_values":pcrs}})
+        _work_pool.submit(pcr_task)
+    elif t=="health_report":
+        status=p.get("status","unknown")
+        ec=p.get("exit_code")
+        wt=p.get("workload_type","unknown")
+        msg_text=f"Health: status={status}, workload={wt}"
+        if ec is not None:msg_text+=f", exit_code={ec}"
+        cw.write("health",msg_text)
+    else:
+        cw.write("system",f"Unknown message type: {t}")
+        state.reply({"type":"error","id":mid,"payload":{"error":f"Unknown: {t}"}})
+
+def serve(sock,cw):
+    sel=selectors.DefaultSelector()
+    sel.register(sock,selectors.EVENT_READ,None)
+    while True:
+        for key,_ in sel.select():
+            if key.data is None:
+                conn,addr=sock.accept()
+                cw.write("system",f"Connection accepted from {addr}")
+                sel.register(conn,selectors.EVENT_READ,ConnState(conn,addr))
+                continue
+            state=key.data
+            try:
+                data=state.conn.recv(65536)
+            except Exception as e:
+                cw.write("errors",f"Connection error: {e}")
+                data=b""
+            if not data:
+                sel.unregister(state.conn)
+                state.conn.close()
+                cw.write("system","Connection closed")
+                continue
+            try:
+                for msg in state.extract_frames(data):process_message(state,msg,cw)
+            except Exception as e:
+                cw.write("errors",f"Connection error: {e}")
+                sel.unregister(state.conn)
+                state.conn.close()
 
 def main():
     enclave_id=sys.argv[1]
@@ -171,10 +305,7 @@ def main():
         sock.bind((VMADDR_CID_ANY,VSOCK_PORT))
         sock.listen(5)
         cw.write("system",f"Listening on vsock port {VSOCK_PORT}")
-        while True:
-            conn,addr=sock.accept()
-            cw.write("system",f"Connection accepted from {addr}")
-            threading.Thread(target=handle_connection,args=(conn,addr,cw),daemon=True).start()
+        serve(sock,cw)
     except Exception as e:
         cw.write("errors",f"Parent proxy failed: {e}")
         sys.exit(1)
@@ -25,6 +25,8 @@ log "  Memory (MiB):   $memory_mib"
 yum update -y
 yum install -y docker python3 python3-pip curl jq
 pip3 install boto3
+# orjson speeds up the vsock frame codec; parent_proxy falls back to stdlib json if absent
+pip3 install orjson || true
 systemctl start docker
 systemctl enable docker
 amazon-linux-extras install aws-nitro-enclaves-cli -y
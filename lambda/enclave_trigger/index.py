@@ -1,16 +1,102 @@
 import json
+try:
+    import orjson
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj).decode('utf-8')
+
+    _json_loads = orjson.loads
+except ImportError:  # orjson is in requirements.txt; fall back for local runs
+    _json_dumps = json.dumps
+    _json_loads = json.loads
 import boto3
 import os
 import logging
-from datetime import datetime
+import time
+import threading
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.config import Config
+
+
+def _now_iso(ts=None):
+    """UTC ISO-8601 timestamp via time.strftime; skips the datetime allocation."""
+    if ts is None:
+        ts = time.time()
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(ts)) + f".{int(ts % 1 * 1_000_000):06d}"
+
+# Shared client config: the default 10-connection pool stalls the threaded
+# fan-outs in these handlers
+_BOTO_CONFIG = Config(
+    max_pool_connections=50,
+    retries={'mode': 'adaptive', 'max_attempts': 3},
+    tcp_keepalive=True,
+)
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize AWS clients
-stepfunctions = boto3.client('stepfunctions')
-dynamodb = boto3.resource('dynamodb')
+# Step Functions client is created lazily: building a boto3 client loads the
+# full service model, which is pure cold-start cost for invocations that end
+# up with no matching records. The bound start_execution method is cached so
+# warm records skip the client attribute lookup as well. Double-checked lock
+# because the executor threads race here on a cold-start batch and client
+# creation on the shared default session is not thread-safe.
+_start_execution = None
+_start_execution_lock = threading.Lock()
+
+def _sfn_start():
+    global _start_execution
+    if _start_execution is None:
+        with _start_execution_lock:
+            if _start_execution is None:
+                _start_execution = boto3.client('stepfunctions', config=_BOTO_CONFIG).start_execution
+    return _start_execution
+
+# Shared deserializer for DynamoDB stream AttributeValues
+_deserializer = TypeDeserializer()
+
+def _to_native(value):
+    """Convert a deserialized DynamoDB value into the shapes downstream expects.
+
+    Numbers come back as Decimal and lists as Python lists; Terraform inputs
+    expect ints and comma-joined strings, so normalize recursively.
+    """
+    if isinstance(value, Decimal):
+        return int(value)
+    if isinstance(value, list):
+        return ','.join(str(_to_native(item)) for item in value)
+    if isinstance(value, set):
+        # SS/NS/BS come back as sets; sort for a deterministic join
+        return ','.join(sorted(str(_to_native(item)) for item in value))
+    if isinstance(value, dict):
+        return {k: _to_native(v) for k, v in value.items()}
+    return value
+
+# Resolve configuration once per container instead of per invocation
+DEPLOYMENT_STEP_FUNCTION_ARN = os.environ.get('DEPLOYMENT_STEP_FUNCTION_ARN')
+CLEANUP_STEP_FUNCTION_ARN = os.environ.get('CLEANUP_STEP_FUNCTION_ARN')
+TABLE_NAME = os.environ.get('DYNAMODB_TABLE_NAME')
+
+# Module singleton so warm invocations reuse the worker threads
+_EXECUTOR = ThreadPoolExecutor(max_workers=16)
+
+# Only these status values trigger a workflow
+_TARGET_STATUSES = frozenset(('PENDING_DEPLOY', 'PENDING_DESTROY'))
+
+# Workload manifest fields lifted out of provider config, with their defaults
+_WORKLOAD_FIELDS = (
+    ('dockerImage', 'hello-world'),
+    ('workloadType', 'batch'),
+    ('healthCheckPath', '/health'),
+    ('healthCheckInterval', 30),
+    ('awsServices', ''),
+    ('exposePorts', ''),
+)
 
 def handler(event, context):
     """
@@ -18,34 +104,54 @@ def handler(event, context):
     Starts Step Functions execution for enclave deployment or destruction.
     """
     try:
-        logger.info(f"Received event: {json.dumps(event)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            # serializing a full stream batch can be megabytes; only pay for it
+            # when debug logging is actually on
+            logger.debug("Received event: %s", _json_dumps(event))
         
-        deployment_step_function_arn = os.environ['DEPLOYMENT_STEP_FUNCTION_ARN']
-        cleanup_step_function_arn = os.environ['CLEANUP_STEP_FUNCTION_ARN']
-        table_name = os.environ['DYNAMODB_TABLE_NAME']
-        
-        for record in event['Records']:
-            if record['eventName'] in ['INSERT', 'MODIFY']:
-                process_record(record, deployment_step_function_arn, cleanup_step_function_arn)
+        records = [r for r in event['Records'] if r['eventName'] in ['INSERT', 'MODIFY']]
+        if records:
+            # start_execution is network-bound, so fan the batch out across threads
+            now = time.time()
+            events = []
+            futures = [
+                _EXECUTOR.submit(process_record, r, DEPLOYMENT_STEP_FUNCTION_ARN, CLEANUP_STEP_FUNCTION_ARN, now, events)
+                for r in records
+            ]
+            concurrent.futures.wait(futures)
+            for future in futures:
+                future.result()  # re-raise the first record failure
+            if events:
+                # one structured log line per invocation instead of several per record
+                logger.info("%s", _json_dumps({
+                    'invocation': getattr(context, 'aws_request_id', None),
+                    'events': events
+                }))
         
         return {
             'statusCode': 200,
-            'body': json.dumps('Successfully processed DynamoDB stream events')
+            'body': _json_dumps('Successfully processed DynamoDB stream events')
         }
         
     except Exception as e:
         logger.error(f"Error processing event: {str(e)}")
         raise e
 
-def process_record(record, deployment_step_function_arn, cleanup_step_function_arn):
+def process_record(record, deployment_step_function_arn, cleanup_step_function_arn, now=None, events=None):
     """Process a single DynamoDB stream record"""
     try:
-        # Extract enclave data from the record
-        if 'NewImage' in record['dynamodb']:
-            new_image = record['dynamodb']['NewImage']
-            
+        if events is None:
+            events = []
+
+        # Gate on status before decoding anything else: most MODIFY events are
+        # status-neutral updates that should exit as cheaply as possible
+        new_image = record['dynamodb'].get('NewImage')
+        if not new_image:
+            return
+        
+        status = new_image.get('status', {}).get('S')
+        if status in _TARGET_STATUSES:
             enclave_id = new_image.get('id', {}).get('S')
-            status = new_image.get('status', {}).get('S')
             wallet_address = new_image.get('walletAddress', {}).get('S', '')
             
             if not enclave_id:
@@ -56,76 +162,66 @@ def process_record(record, deployment_step_function_arn, cleanup_step_function_a
                 logger.warning(f"No wallet address found for enclave {enclave_id}")
                 # Continue anyway for backwards compatibility
             
-            logger.info(f"Processing enclave {enclave_id} with status {status} for wallet {wallet_address}")
+            events.append({'evt': 'processing', 'enclave': enclave_id, 'status': status, 'wallet': wallet_address})
+            
+            action = 'deploy' if status == 'PENDING_DEPLOY' else 'destroy'
+            
+            # Select the appropriate Step Functions state machine based on action
+            step_function_arn = deployment_step_function_arn if action == 'deploy' else cleanup_step_function_arn
+            
+            # Prepare Step Functions input
+            provider_id = new_image.get('providerId', {}).get('S', 'aws-nitro')
+            provider_config = new_image.get('providerConfig', {}).get('M', {})
+            
+            # Convert DynamoDB format to regular dict for provider config.
+            # TypeDeserializer handles nested M/L/NS/SS values the old
+            # hand-rolled branches silently dropped.
+            config_dict = {
+                key: _to_native(_deserializer.deserialize(value))
+                for key, value in provider_config.items()
+            }
+            
+            # Set configuration based on provider
+            if provider_id == 'aws-nitro':
+                configuration = 'main.tf'  # Use the standard main.tf configuration
+            else:
+                configuration = new_image.get('configuration', {}).get('S', 'main.tf')
+            
+            # Extract workload manifest fields from provider config
+            workload = {key: config_dict.pop(key, default) for key, default in _WORKLOAD_FIELDS}
+            
+            if now is None:
+                now = time.time()
+            # most provider-config values are already str; skip the call
+            _s = lambda v: v if type(v) is str else str(v)
+            step_input = {
+                'enclave_id': enclave_id,
+                'action': action,
+                'configuration': '{}' if not config_dict else _json_dumps(config_dict),
+                'terraform_config': configuration,
+                'wallet_address': wallet_address,
+                'docker_image': _s(workload['dockerImage']),
+                'workload_type': _s(workload['workloadType']),
+                'health_check_path': _s(workload['healthCheckPath']),
+                'health_check_interval': _s(workload['healthCheckInterval']),
+                'aws_services': _s(workload['awsServices']),
+                'expose_ports': _s(workload['exposePorts']),
+                'timestamp': _now_iso(now)
+            }
+            
+            # Start Step Functions execution
+            execution_name = f"{enclave_id}-{action}-{int(now)}"
+            
+            events.append({'evt': 'starting_workflow', 'enclave': enclave_id, 'action': action, 'state_machine': step_function_arn})
+            
+            response = _sfn_start()(
+                stateMachineArn=step_function_arn,
+                name=execution_name,
+                input=_json_dumps(step_input)
+            )
+            
+            events.append({'evt': 'execution_started', 'enclave': enclave_id, 'execution_arn': response['executionArn']})
             
-            # Only trigger for specific status changes
-            if status in ['PENDING_DEPLOY', 'PENDING_DESTROY']:
-                action = 'deploy' if status == 'PENDING_DEPLOY' else 'destroy'
-                
-                # Select the appropriate Step Functions state machine based on action
-                step_function_arn = deployment_step_function_arn if action == 'deploy' else cleanup_step_function_arn
-                
-                # Prepare Step Functions input
-                provider_id = new_image.get('providerId', {}).get('S', 'aws-nitro')
-                provider_config = new_image.get('providerConfig', {}).get('M', {})
-                
-                # Convert DynamoDB format to regular dict for provider config
-                config_dict = {}
-                for key, value in provider_config.items():
-                    if 'S' in value:
-                        config_dict[key] = value['S']
-                    elif 'N' in value:
-                        config_dict[key] = int(value['N'])
-                    elif 'BOOL' in value:
-                        config_dict[key] = value['BOOL']
-                    elif 'L' in value:
-                        # Handle list values (e.g., awsServices, exposePorts)
-                        config_dict[key] = ','.join(
-                            item.get('S', '') for item in value['L'] if 'S' in item
-                        )
-                
-                # Set configuration based on provider
-                if provider_id == 'aws-nitro':
-                    configuration = 'main.tf'  # Use the standard main.tf configuration
-                else:
-                    configuration = new_image.get('configuration', {}).get('S', 'main.tf')
-                
-                # Extract workload manifest fields from provider config
-                docker_image = config_dict.pop('dockerImage', 'hello-world')
-                workload_type = config_dict.pop('workloadType', 'batch')
-                health_check_path = config_dict.pop('healthCheckPath', '/health')
-                health_check_interval = config_dict.pop('healthCheckInterval', 30)
-                aws_services = config_dict.pop('awsServices', '')
-                expose_ports = config_dict.pop('exposePorts', '')
-                
-                step_input = {
-                    'enclave_id': enclave_id,
-                    'action': action,
-                    'configuration': json.dumps(config_dict) if config_dict else '{}',
-                    'terraform_config': configuration,
-                    'wallet_address': wallet_address,
-                    'docker_image': str(docker_image),
-                    'workload_type': str(workload_type),
-                    'health_check_path': str(health_check_path),
-                    'health_check_interval': str(health_check_interval),
-                    'aws_services': str(aws_services),
-                    'expose_ports': str(expose_ports),
-                    'timestamp': datetime.utcnow().isoformat()
-                }
-                
-                # Start Step Functions execution
-                execution_name = f"{enclave_id}-{action}-{int(datetime.utcnow().timestamp())}"
-                
-                logger.info(f"Starting {action} workflow using state machine: {step_function_arn}")
-                
-                response = stepfunctions.start_execution(
-                    stateMachineArn=step_function_arn,
-                    name=execution_name,
-                    input=json.dumps(step_input)
-                )
-                
-                logger.info(f"Started Step Functions execution: {response['executionArn']}")
-                
     except Exception as e:
         logger.error(f"Error processing record: {str(e)}")
         raise e
\ No newline at end of file
@@ -1,8 +1,25 @@
 import json
+try:
+    import orjson
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj).decode('utf-8')
+
+    def _json_dumps_pretty(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode('utf-8')
+
+    _json_loads = orjson.loads
+except ImportError:  # orjson is in requirements.txt; fall back for local runs
+    _json_dumps = json.dumps
+
+    def _json_dumps_pretty(obj):
+        return json.dumps(obj, indent=2)
+
+    _json_loads = json.loads
 import boto3
 import os
 import logging
-from datetime import datetime
+import time
 
 # Configure logging with structured format (consistent with validation lambda)
 logger = logging.getLogger()
@@ -15,9 +32,30 @@ formatter = logging.Formatter(
 for handler in logger.handlers:
     handler.setFormatter(formatter)
 
+from botocore.config import Config
+
+# Adaptive retries and TCP keepalive smooth over transient DynamoDB/SNS
+# errors, which is exactly the traffic an error handler sees
+_BOTO_CONFIG = Config(
+    max_pool_connections=50,
+    retries={'mode': 'adaptive', 'max_attempts': 3},
+    tcp_keepalive=True,
+)
+
+
+def _now_iso(ts=None):
+    """UTC ISO-8601 timestamp via time.strftime; skips the datetime allocation."""
+    if ts is None:
+        ts = time.time()
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(ts)) + f".{int(ts % 1 * 1_000_000):06d}"
+
 # Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-sns = boto3.client('sns')
+dynamodb = boto3.resource('dynamodb', config=_BOTO_CONFIG)
+sns = boto3.client('sns', config=_BOTO_CONFIG)
+
+# dynamodb.Table() builds a resource model each call; do it once per container
+_TABLE_NAME = os.environ.get('DYNAMODB_TABLE_NAME')
+_TABLE = dynamodb.Table(_TABLE_NAME) if _TABLE_NAME else None
 
 def handler(event, context):
     """
@@ -25,7 +63,8 @@ def handler(event, context):
     Logs errors, updates status, and optionally sends notifications.
     """
     try:
-        logger.info(f"Handling error event: {json.dumps(event)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Handling error event: %s", _json_dumps(event))
         
         enclave_id = event.get('enclave_id')
         error_info = event.get('error', {})
@@ -58,47 +97,48 @@ def handler(event, context):
         logger.error(f"Error in error handler: {str(e)}")
         return create_response(False, f"Error handler failed: {str(e)}")
 
+# Candidate fields probed once per error, in priority order
+_MESSAGE_FIELDS = ('Cause', 'Error', 'Message', 'message')
+_TYPE_FIELDS = ('Error', 'errorType', 'type')
+
 def extract_error_message(error_info):
     """Extract human-readable error message from error info"""
     if isinstance(error_info, dict):
-        # Try different error message fields
-        for field in ['Cause', 'Error', 'Message', 'message']:
-            if field in error_info:
+        for field in _MESSAGE_FIELDS:
+            value = error_info.get(field)
+            if value is None:
+                continue
+            # If it's JSON, try to parse it
+            if isinstance(value, str) and value[:1] == '{':
                 try:
-                    # If it's JSON, try to parse it
-                    if isinstance(error_info[field], str) and error_info[field].startswith('{'):
-                        parsed = json.loads(error_info[field])
-                        return parsed.get('errorMessage', error_info[field])
-                    return str(error_info[field])
-                except:
-                    return str(error_info[field])
-        
+                    return _json_loads(value).get('errorMessage', value)
+                except Exception:
+                    return value
+            return str(value)
+
         # If no specific field found, return the whole error as string
-        return json.dumps(error_info)
-    
+        return _json_dumps(error_info)
+
     return str(error_info)
 
 def extract_error_type(error_info):
     """Extract error type from error info"""
     if isinstance(error_info, dict):
-        # Try different error type fields
-        for field in ['Error', 'errorType', 'type']:
-            if field in error_info:
-                return str(error_info[field])
-    
+        for field in _TYPE_FIELDS:
+            value = error_info.get(field)
+            if value is not None:
+                return str(value)
+
     return "UnknownError"
 
 def update_enclave_error_status(enclave_id, error_message, error_type):
     """Update enclave status in DynamoDB with error information"""
     try:
-        table_name = os.environ.get('DYNAMODB_TABLE_NAME')
-        if not table_name:
+        if _TABLE is None:
             logger.warning("No DynamoDB table name configured")
             return False
         
-        table = dynamodb.Table(table_name)
-        
-        response = table.update_item(
+        response = _TABLE.update_item(
             Key={'id': enclave_id},
             UpdateExpression='SET #status = :status, #updated_at = :timestamp, #error_message = :error_msg, #error_type = :error_type',
             ExpressionAttributeNames={
@@ -109,7 +149,7 @@ def update_enclave_error_status(enclave_id, error_message, error_type):
             },
             ExpressionAttributeValues={
                 ':status': 'FAILED',
-                ':timestamp': datetime.utcnow().isoformat(),
+                ':timestamp': _now_iso(),
                 ':error_msg': error_message,
                 ':error_type': error_type
             },
@@ -135,15 +175,17 @@ def send_error_notification(enclave_id, error_message, error_type):
             'enclave_id': enclave_id,
             'error_type': error_type,
             'error_message': error_message,
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': _now_iso(),
             'source': 'treza-terraform-infrastructure'
         }
         
         subject = f"Treza Enclave Error: {enclave_id}"
         
+        # indented for the humans reading the notification; orjson's native
+        # indenting is still far cheaper than stdlib pretty-printing
         response = sns.publish(
             TopicArn=sns_topic_arn,
-            Message=json.dumps(message, indent=2),
+            Message=_json_dumps_pretty(message),
             Subject=subject
         )
         
@@ -159,7 +201,7 @@ def create_response(success, message, data=None):
     response = {
         'success': success,
         'message': message,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': _now_iso()
     }
     
     if data:
@@ -1,16 +1,57 @@
 import json
+try:
+    import orjson
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj).decode('utf-8')
+
+    _json_loads = orjson.loads
+except ImportError:  # orjson is in requirements.txt; fall back for local runs
+    _json_dumps = json.dumps
+    _json_loads = json.loads
 import boto3
+import botocore.exceptions
 import os
 import logging
-from datetime import datetime
+import time
+
+from boto3.dynamodb.conditions import Key
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+from botocore.config import Config
+
+# One monitoring cycle issues a burst of EC2 and DynamoDB calls; adaptive
+# retries absorb throttling and the larger pool keeps connections warm
+# across scheduled invocations
+_BOTO_CONFIG = Config(
+    max_pool_connections=50,
+    retries={'mode': 'adaptive', 'max_attempts': 3},
+    tcp_keepalive=True,
+)
+
+
+def _now_iso(ts=None):
+    """UTC ISO-8601 timestamp via time.strftime; skips the datetime allocation."""
+    if ts is None:
+        ts = time.time()
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(ts)) + f".{int(ts % 1 * 1_000_000):06d}"
+
 # Initialize AWS clients
-ec2 = boto3.client('ec2')
-dynamodb = boto3.resource('dynamodb')
+ec2 = boto3.client('ec2', config=_BOTO_CONFIG)
+dynamodb = boto3.resource('dynamodb', config=_BOTO_CONFIG)
+
+# dynamodb.Table() builds a resource model each call; do it once per container
+_TABLE_NAME = os.environ.get('DYNAMODB_TABLE_NAME')
+_TABLE = dynamodb.Table(_TABLE_NAME) if _TABLE_NAME else None
+
+# Which transitional statuses this deployment of the monitor owns; lets one
+# code package back multiple monitor Lambdas with different scopes
+_MONITOR_STATES = tuple(
+    s.strip() for s in os.environ.get('MONITOR_STATES', 'PAUSING,RESUMING,DESTROYING').split(',') if s.strip()
+)
 
 def handler(event, context):
     """
@@ -20,87 +61,164 @@ def handler(event, context):
     try:
         logger.info("Starting enclave status monitoring")
         
-        table_name = os.environ['DYNAMODB_TABLE_NAME']
-        table = dynamodb.Table(table_name)
+        table = _TABLE if _TABLE is not None else dynamodb.Table(os.environ['DYNAMODB_TABLE_NAME'])
+        table_name = table.name
+        
+        instances_by_enclave = collect_enclave_instances()
+        
+        status_updates = []
+        instance_actions = {'stop': [], 'start': []}
+        events = []
+        # Query the status GSI per transitional state instead of scanning the
+        # whole table: reads scale with matching items, not table size
+        for status in _MONITOR_STATES:
+            query_kwargs = {
+                'IndexName': 'status-index',
+                'KeyConditionExpression': Key('status').eq(status),
+                'ProjectionExpression': 'id, #s',
+                'ExpressionAttributeNames': {'#s': 'status'},
+            }
+            while True:
+                response = table.query(**query_kwargs)
+                for item in response['Items']:
+                    new_status = process_enclave_status(item, instances_by_enclave, instance_actions, events)
+                    if new_status:
+                        status_updates.append((item['id'], new_status, item['status']))
+                if 'LastEvaluatedKey' not in response:
+                    break
+                query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
         
-        # Scan for enclaves in transitional states
-        transitional_statuses = ['PAUSING', 'RESUMING', 'DESTROYING']
+        flush_instance_actions(instance_actions)
+        flush_status_updates(table_name, status_updates, events)
         
-        for status in transitional_statuses:
-            response = table.scan(
-                FilterExpression='#status = :status',
-                ExpressionAttributeNames={'#status': 'status'},
-                ExpressionAttributeValues={':status': status}
-            )
-            
-            for item in response['Items']:
-                process_enclave_status(item, table)
+        if events:
+            # one structured log line per invocation instead of several per enclave
+            logger.info("%s", _json_dumps({
+                'invocation': getattr(context, 'aws_request_id', None),
+                'events': events
+            }))
         
         return {
             'statusCode': 200,
-            'body': json.dumps('Successfully monitored enclave statuses')
+            'body': _json_dumps('Successfully monitored enclave statuses')
         }
         
     except Exception as e:
         logger.error(f"Error monitoring statuses: {str(e)}")
         raise e
 
-def process_enclave_status(enclave, table):
-    """Process a single enclave's status"""
+def _instance_states():
+    states = ['running', 'stopped', 'stopping', 'pending']
+    # terminated instances only matter when this monitor owns DESTROYING
+    if 'DESTROYING' in _MONITOR_STATES:
+        states.append('terminated')
+    return states
+
+# Paginator and filters are fixed for the container lifetime; building them
+# per call repeats botocore's model lookups
+_EC2_PAGINATOR = ec2.get_paginator('describe_instances')
+_EC2_FILTERS = [
+    {'Name': 'tag-key', 'Values': ['EnclaveId']},
+    {'Name': 'instance-state-name', 'Values': _instance_states()}
+]
+
+def collect_enclave_instances():
+    """Map enclave id to (instance_id, state) with one paginated describe call."""
+    instances_by_enclave = {}
+    pages = _EC2_PAGINATOR.paginate(Filters=_EC2_FILTERS)
+    for page in pages:
+        for reservation in page['Reservations']:
+            for instance in reservation['Instances']:
+                enclave_id = next(
+                    (tag['Value'] for tag in instance.get('Tags', []) if tag['Key'] == 'EnclaveId'),
+                    None
+                )
+                if enclave_id:
+                    instances_by_enclave[enclave_id] = (instance['InstanceId'], instance['State']['Name'])
+    return instances_by_enclave
+
+def flush_instance_actions(actions):
+    """Issue one stop_instances/start_instances call per action type."""
+    if actions['stop']:
+        try:
+            logger.info(f"Stopping instances: {actions['stop']}")
+            ec2.stop_instances(InstanceIds=actions['stop'])
+        except Exception as e:
+            logger.error(f"Failed to stop instances {actions['stop']}: {str(e)}")
+    if actions['start']:
+        try:
+            logger.info(f"Starting instances: {actions['start']}")
+            ec2.start_instances(InstanceIds=actions['start'])
+        except Exception as e:
+            logger.error(f"Failed to start instances {actions['start']}: {str(e)}")
+
+def _update_request(table_name, enclave_id, new_status, expected_status, timestamp):
+    """Build one conditional status update in low-level AttributeValue form."""
+    return {
+        'TableName': table_name,
+        'Key': {'id': {'S': enclave_id}},
+        'UpdateExpression': 'SET #status = :status, #updated_at = :timestamp',
+        # only advance enclaves still in the status we observed; another
+        # writer may have moved them on since the scan
+        'ConditionExpression': '#status = :expected',
+        'ExpressionAttributeNames': {
+            '#status': 'status',
+            '#updated_at': 'updatedAt'
+        },
+        'ExpressionAttributeValues': {
+            ':status': {'S': new_status},
+            ':timestamp': {'S': timestamp},
+            ':expected': {'S': expected_status}
+        }
+    }
+
+def flush_status_updates(table_name, updates, events):
+    """Apply collected status changes in transactional batches of 25."""
+    if not updates:
+        return
+    
+    timestamp = _now_iso()
+    client = dynamodb.meta.client
+    for start in range(0, len(updates), 25):
+        chunk = updates[start:start + 25]
+        try:
+            client.transact_write_items(TransactItems=[
+                {'Update': _update_request(table_name, enclave_id, new_status, expected, timestamp)}
+                for enclave_id, new_status, expected in chunk
+            ])
+        except client.exceptions.TransactionCanceledException:
+            # one stale item cancels the whole transaction; retry items
+            # individually so the rest still land
+            for enclave_id, new_status, expected in chunk:
+                try:
+                    client.update_item(**_update_request(table_name, enclave_id, new_status, expected, timestamp))
+                except botocore.exceptions.ClientError as e:
+                    if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                        events.append({'evt': 'update_skipped', 'enclave': enclave_id, 'reason': 'status changed by another writer'})
+                    else:
+                        raise
+            continue
+        for enclave_id, new_status, _ in chunk:
+            events.append({'evt': 'status_updated', 'enclave': enclave_id, 'status': new_status})
+
+def process_enclave_status(enclave, instances_by_enclave, instance_actions, events):
+    """Check one enclave and return its new status, or None if unchanged."""
     try:
         enclave_id = enclave['id']
         current_status = enclave['status']
         
-        logger.info(f"Checking enclave {enclave_id} with status {current_status}")
-        
-        # Find the associated EC2 instance
-        ec2_response = ec2.describe_instances(
-            Filters=[
-                {
-                    'Name': 'tag:EnclaveId',
-                    'Values': [enclave_id]
-                },
-                {
-                    'Name': 'instance-state-name',
-                    'Values': ['running', 'stopped', 'stopping', 'pending', 'terminated']
-                }
-            ]
-        )
-        
-        instance_id = None
-        instance_state = None
-        
-        # Find the instance
-        for reservation in ec2_response['Reservations']:
-            for instance in reservation['Instances']:
-                instance_id = instance['InstanceId']
-                instance_state = instance['State']['Name']
-                break
+        instance_id, instance_state = instances_by_enclave.get(enclave_id, (None, None))
         
         if not instance_id:
             # Check if this is a DESTROYING enclave - if so, instance might already be terminated and cleaned up
             if current_status == 'DESTROYING':
-                logger.info(f"No EC2 instance found for DESTROYING enclave {enclave_id} - likely already terminated, marking as DESTROYED")
-                new_status = 'DESTROYED'
-                # Update status directly since we have the info we need
-                table.update_item(
-                    Key={'id': enclave_id},
-                    UpdateExpression='SET #status = :status, #updated_at = :timestamp',
-                    ExpressionAttributeNames={
-                        '#status': 'status',
-                        '#updated_at': 'updatedAt'
-                    },
-                    ExpressionAttributeValues={
-                        ':status': new_status,
-                        ':timestamp': datetime.utcnow().isoformat()
-                    }
-                )
-                return
+                events.append({'evt': 'no_instance_destroyed', 'enclave': enclave_id})
+                return 'DESTROYED'
             else:
                 logger.warning(f"No EC2 instance found for enclave {enclave_id}")
-                return
+                return None
         
-        logger.info(f"Instance {instance_id} state: {instance_state}")
+        events.append({'evt': 'checking', 'enclave': enclave_id, 'status': current_status, 'instance': instance_id, 'instance_state': instance_state})
         
         # Determine the new status and take actions based on current status and instance state
         new_status = None
@@ -108,13 +226,10 @@ def process_enclave_status(enclave, table):
         
         if current_status == 'PAUSING':
             if instance_state == 'running':
-                # Need to stop the instance
-                try:
-                    logger.info(f"Stopping instance {instance_id} for enclave {enclave_id}")
-                    ec2.stop_instances(InstanceIds=[instance_id])
-                    action_taken = True
-                except Exception as e:
-                    logger.error(f"Failed to stop instance {instance_id}: {str(e)}")
+                # Queue the stop; all stops go out in one call at end of cycle
+                events.append({'evt': 'stopping_instance', 'enclave': enclave_id, 'instance': instance_id})
+                instance_actions['stop'].append(instance_id)
+                action_taken = True
             elif instance_state == 'stopped':
                 new_status = 'PAUSED'
             elif instance_state in ['stopping']:
@@ -125,13 +240,10 @@ def process_enclave_status(enclave, table):
         
         elif current_status == 'RESUMING':
             if instance_state == 'stopped':
-                # Need to start the instance
-                try:
-                    logger.info(f"Starting instance {instance_id} for enclave {enclave_id}")
-                    ec2.start_instances(InstanceIds=[instance_id])
-                    action_taken = True
-                except Exception as e:
-                    logger.error(f"Failed to start instance {instance_id}: {str(e)}")
+                # Queue the start; all starts go out in one call at end of cycle
+                events.append({'evt': 'starting_instance', 'enclave': enclave_id, 'instance': instance_id})
+                instance_actions['start'].append(instance_id)
+                action_taken = True
             elif instance_state == 'running':
                 new_status = 'DEPLOYED'
             elif instance_state in ['pending']:
@@ -144,38 +256,23 @@ def process_enclave_status(enclave, table):
             if instance_state == 'terminated':
                 # Instance has been terminated, mark as destroyed
                 new_status = 'DESTROYED'
-                logger.info(f"Instance {instance_id} is terminated, marking enclave {enclave_id} as DESTROYED")
+                events.append({'evt': 'instance_terminated', 'enclave': enclave_id, 'instance': instance_id})
             elif instance_state in ['running', 'stopped']:
                 # Instance still exists but should be terminated - this might indicate a stuck destruction
                 logger.warning(f"Enclave {enclave_id} is in DESTROYING state but instance {instance_id} is still {instance_state}")
                 # Could potentially trigger termination here if needed
             elif instance_state in ['stopping']:
                 # Instance is being stopped as part of termination process
-                logger.info(f"Instance {instance_id} is stopping as part of destruction process for enclave {enclave_id}")
+                events.append({'evt': 'instance_stopping', 'enclave': enclave_id, 'instance': instance_id})
             else:
                 logger.warning(f"Unexpected state {instance_state} for destroying enclave {enclave_id}")
         
-        # Update status if changed
+        # Report the status change for the batched flush at end of cycle
         if new_status and new_status != current_status:
-            logger.info(f"Updating enclave {enclave_id} status from {current_status} to {new_status}")
-            
-            table.update_item(
-                Key={'id': enclave_id},
-                UpdateExpression='SET #status = :status, #updated_at = :timestamp',
-                ExpressionAttributeNames={
-                    '#status': 'status',
-                    '#updated_at': 'updatedAt'
-                },
-                ExpressionAttributeValues={
-                    ':status': new_status,
-                    ':timestamp': datetime.utcnow().isoformat()
-                }
-            )
-            
-            logger.info(f"Successfully updated enclave {enclave_id} to {new_status}")
-        elif action_taken:
-            logger.info(f"Action taken for enclave {enclave_id}, will check again next cycle")
-            
+            events.append({'evt': 'status_change', 'enclave': enclave_id, 'from': current_status, 'to': new_status})
+            return new_status
+        return None
+        
     except Exception as e:
         logger.error(f"Error processing enclave {enclave.get('id', 'unknown')}: {str(e)}")
         raise e
@@ -52,7 +52,8 @@ resource "aws_iam_role_policy" "lambda_execution" {
         ]
         Resource = [
           var.dynamodb_table_arn,
-          "${var.dynamodb_table_arn}/stream/*"
+          "${var.dynamodb_table_arn}/stream/*",
+          "${var.dynamodb_table_arn}/index/*"
         ]
       },
       {
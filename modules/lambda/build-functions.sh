@@ -41,7 +41,22 @@ build_function() {
     find "$temp_dir" -name "*.pyc" -delete
     find "$temp_dir" -name "__pycache__" -type d -exec rm -rf {} + 2>/dev/null || true
     find "$temp_dir" -name "*.dist-info" -type d -exec rm -rf {} + 2>/dev/null || true
-    
+
+    # Dependencies ship their own test/benchmark payload; dead weight in a zip
+    find "$temp_dir" -type d \( -name "tests" -o -name "benchmarks" \) -exec rm -rf {} + 2>/dev/null || true
+
+    # Precompile dependencies to .pyc and drop their sources so cold starts
+    # skip the compile step. Bytecode is only portable within a minor version,
+    # so this only runs when the build interpreter matches the python3.9
+    # Lambda runtime; index.py always ships as source.
+    local py_ver=$(python3 -c 'import sys; print("%d.%d" % sys.version_info[:2])')
+    if [ "$py_ver" = "3.9" ]; then
+        python3 -m compileall -q -b "$temp_dir" || true
+        find "$temp_dir" -name "*.py" ! -name "index.py" -delete
+        rm -f "$temp_dir/index.pyc"
+        find "$temp_dir" -name "__pycache__" -type d -exec rm -rf {} + 2>/dev/null || true
+    fi
+
     # Create ZIP file
     cd "$temp_dir"
     zip -r "$build_file" . -x "requirements.txt" > /dev/null
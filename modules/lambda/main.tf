@@ -82,6 +82,7 @@ resource "aws_lambda_function" "status_monitor" {
   environment {
     variables = {
       DYNAMODB_TABLE_NAME = var.dynamodb_table_name
+      MONITOR_STATES      = "PAUSING,RESUMING,DESTROYING"
     }
   }
   
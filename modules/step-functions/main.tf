@@ -67,7 +67,8 @@ resource "aws_sfn_state_machine" "deployment" {
           Payload = {
             "enclave_id.$" = "$.enclave_id"
             "action.$" = "$.action"
-            "configuration.$" = "$.configuration"
+            # parsed here so the Lambda receives an object, not a JSON string
+            "configuration.$" = "States.StringToJson($.configuration)"
           }
         }
         ResultPath = "$.validation_result"
@@ -1,20 +1,12 @@
 import pytest
 import os
-import sys
 
-# Add lambda directories to Python path for testing
-test_dir = os.path.dirname(__file__)
-project_root = os.path.dirname(test_dir)
-
-lambda_dirs = [
-    os.path.join(project_root, 'lambda', 'enclave_trigger'),
-    os.path.join(project_root, 'lambda', 'validation'),
-    os.path.join(project_root, 'lambda', 'error_handler')
-]
-
-for lambda_dir in lambda_dirs:
-    if os.path.exists(lambda_dir):
-        sys.path.insert(0, lambda_dir)
+# The lambda handler directories are NOT put on sys.path here: every handler
+# is an identically named index.py, so stacking three directories at the
+# front of sys.path made `import index` resolve to whichever came first and
+# added per-import stat calls for the whole suite. `lambda` is a reserved
+# word, so the directories cannot become a regular package either; tests
+# that exercise a handler add exactly the one directory they need.
 
 @pytest.fixture(scope="session")
 def aws_credentials():
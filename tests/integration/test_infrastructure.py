@@ -7,6 +7,7 @@ import boto3
 import pytest
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List
 
 # AWS Region from environment or default
@@ -15,43 +16,56 @@ ENVIRONMENT = os.environ.get('ENVIRONMENT', 'dev')
 PROJECT_NAME = os.environ.get('PROJECT_NAME', 'treza')
 
 
+@pytest.fixture(scope='session')
+def ec2_client():
+    return boto3.client('ec2', region_name=AWS_REGION)
+
+
+@pytest.fixture(scope='session')
+def vpc_response(ec2_client):
+    """Single describe_vpcs call shared by every test that needs the VPC."""
+    return ec2_client.describe_vpcs(
+        Filters=[
+            {'Name': 'tag:Environment', 'Values': [ENVIRONMENT]},
+            {'Name': 'tag:Project', 'Values': [PROJECT_NAME]}
+        ]
+    )
+
+
+@pytest.fixture(scope='session')
+def vpc_id(vpc_response):
+    if not vpc_response['Vpcs']:
+        pytest.skip("VPC not found")
+    return vpc_response['Vpcs'][0]['VpcId']
+
+
+@pytest.fixture(scope='session')
+def vpc_resources(ec2_client, vpc_id):
+    """Fetch subnets, NAT gateways and endpoints for the VPC concurrently."""
+    vpc_filter = [{'Name': 'vpc-id', 'Values': [vpc_id]}]
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        subnets = executor.submit(ec2_client.describe_subnets, Filters=vpc_filter)
+        nat_gateways = executor.submit(ec2_client.describe_nat_gateways, Filters=vpc_filter)
+        endpoints = executor.submit(ec2_client.describe_vpc_endpoints, Filters=vpc_filter)
+        return {
+            'subnets': subnets.result(),
+            'nat_gateways': nat_gateways.result(),
+            'vpc_endpoints': endpoints.result(),
+        }
+
+
 class TestVPCInfrastructure:
     """Test VPC and networking components"""
     
-    @pytest.fixture(scope='class')
-    def ec2_client(self):
-        return boto3.client('ec2', region_name=AWS_REGION)
-    
-    def test_vpc_exists(self, ec2_client):
+    def test_vpc_exists(self, vpc_response):
         """Test that VPC exists with correct tags"""
-        vpcs = ec2_client.describe_vpcs(
-            Filters=[
-                {'Name': 'tag:Environment', 'Values': [ENVIRONMENT]},
-                {'Name': 'tag:Project', 'Values': [PROJECT_NAME]}
-            ]
-        )
-        
-        assert len(vpcs['Vpcs']) >= 1, "VPC not found"
-        vpc = vpcs['Vpcs'][0]
+        assert len(vpc_response['Vpcs']) >= 1, "VPC not found"
+        vpc = vpc_response['Vpcs'][0]
         assert vpc['State'] == 'available', "VPC is not available"
         
-    def test_subnets_exist(self, ec2_client):
+    def test_subnets_exist(self, vpc_resources):
         """Test that public and private subnets exist"""
-        vpcs = ec2_client.describe_vpcs(
-            Filters=[
-                {'Name': 'tag:Environment', 'Values': [ENVIRONMENT]},
-                {'Name': 'tag:Project', 'Values': [PROJECT_NAME]}
-            ]
-        )
-        
-        if not vpcs['Vpcs']:
-            pytest.skip("VPC not found")
-            
-        vpc_id = vpcs['Vpcs'][0]['VpcId']
-        
-        subnets = ec2_client.describe_subnets(
-            Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]}]
-        )
+        subnets = vpc_resources['subnets']
         
         assert len(subnets['Subnets']) >= 4, "Not enough subnets (expected at least 4)"
         
@@ -65,46 +79,18 @@ class TestVPCInfrastructure:
         assert len(public_subnets) >= 2, "Not enough public subnets"
         assert len(private_subnets) >= 2, "Not enough private subnets"
         
-    def test_nat_gateways_exist(self, ec2_client):
+    def test_nat_gateways_exist(self, vpc_resources):
         """Test that NAT gateways exist and are available"""
-        vpcs = ec2_client.describe_vpcs(
-            Filters=[
-                {'Name': 'tag:Environment', 'Values': [ENVIRONMENT]},
-                {'Name': 'tag:Project', 'Values': [PROJECT_NAME]}
-            ]
-        )
-        
-        if not vpcs['Vpcs']:
-            pytest.skip("VPC not found")
-            
-        vpc_id = vpcs['Vpcs'][0]['VpcId']
-        
-        nat_gateways = ec2_client.describe_nat_gateways(
-            Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]}]
-        )
+        nat_gateways = vpc_resources['nat_gateways']
         
         assert len(nat_gateways['NatGateways']) >= 1, "No NAT gateways found"
         
         for nat in nat_gateways['NatGateways']:
             assert nat['State'] in ['available', 'pending'], f"NAT gateway {nat['NatGatewayId']} not available"
             
-    def test_vpc_endpoints_exist(self, ec2_client):
+    def test_vpc_endpoints_exist(self, vpc_resources):
         """Test that required VPC endpoints exist"""
-        vpcs = ec2_client.describe_vpcs(
-            Filters=[
-                {'Name': 'tag:Environment', 'Values': [ENVIRONMENT]},
-                {'Name': 'tag:Project', 'Values': [PROJECT_NAME]}
-            ]
-        )
-        
-        if not vpcs['Vpcs']:
-            pytest.skip("VPC not found")
-            
-        vpc_id = vpcs['Vpcs'][0]['VpcId']
-        
-        endpoints = ec2_client.describe_vpc_endpoints(
-            Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]}]
-        )
+        endpoints = vpc_resources['vpc_endpoints']
         
         assert len(endpoints['VpcEndpoints']) >= 3, "Not enough VPC endpoints"
         
@@ -287,24 +273,8 @@ class TestDynamoDB:
 class TestSecurityGroups:
     """Test security group configuration"""
     
-    @pytest.fixture(scope='class')
-    def ec2_client(self):
-        return boto3.client('ec2', region_name=AWS_REGION)
-    
-    def test_shared_security_group_exists(self, ec2_client):
+    def test_shared_security_group_exists(self, ec2_client, vpc_id):
         """Test that shared enclave security group exists"""
-        vpcs = ec2_client.describe_vpcs(
-            Filters=[
-                {'Name': 'tag:Environment', 'Values': [ENVIRONMENT]},
-                {'Name': 'tag:Project', 'Values': [PROJECT_NAME]}
-            ]
-        )
-        
-        if not vpcs['Vpcs']:
-            pytest.skip("VPC not found")
-            
-        vpc_id = vpcs['Vpcs'][0]['VpcId']
-        
         security_groups = ec2_client.describe_security_groups(
             Filters=[
                 {'Name': 'vpc-id', 'Values': [vpc_id]},